@@ -0,0 +1,135 @@
+import os
+import glob
+import json
+import numpy as np
+import tensorflow as tf
+import tensorflow.python.keras as tf_keras
+from tensorflow.python.keras import layers, models, callbacks
+from sklearn.model_selection import train_test_split
+from tensorflow.python.keras.engine import data_adapter
+from keras.layers import BatchNormalization
+
+from keras import __version__
+tf_keras.__version__ = __version__
+
+import board
+from trained_models.model_version import VERSION
+
+# Whole-board model: one fully convolutional pass maps a board image to an
+# 8x8 grid of 13-way square classes (12 pieces + empty), so no per-tile
+# crops and no confidence threshold for empty squares.
+
+# Config
+LABELS_DIR = "dataset/synthetic/boards"   # written by dataset/Synthetic Boards.py
+OUTPUT_DIR = "trained_models"
+MODEL_NAME = f"chess_board_model{VERSION}.h5"
+BOARD_SIZE = (256, 256)    # 32px per square, must match main.BOARD_SIZE
+SYMBOLS = board.SYMBOLS    # class index -> FEN symbol, the board.py square codes ("." is empty)
+BATCH_SIZE = 16
+EPOCHS = 30
+SEED = 42
+AUGMENT = True
+AUTOTUNE = tf.data.AUTOTUNE
+
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+def _is_distributed_dataset(ds):
+    return isinstance(ds, data_adapter.input_lib.DistributedDatasetSpec)
+
+data_adapter._is_distributed_dataset = _is_distributed_dataset
+
+def fen_to_labels(placement):
+    # class indices are the board.py square codes
+    return board.from_fens([placement])[0].astype(np.int32).reshape(8, 8)
+
+def list_boards(labels_dir=LABELS_DIR):
+    image_paths, labels, themes = [], [], []
+    for labels_file in sorted(glob.glob(os.path.join(labels_dir, "labels_*.jsonl"))):
+        with open(labels_file) as f:
+            for line in f:
+                entry = json.loads(line)
+                image_paths.append(os.path.join(labels_dir, entry["image"]))
+                labels.append(fen_to_labels(entry["fen"]))
+                themes.append(f"{entry['style']}/{entry['theme']}")
+    return np.array(image_paths), np.array(labels, dtype=np.int32).reshape(-1, 8, 8), np.array(themes)
+
+def decode_board(path):
+    img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    img = tf.image.resize(img, BOARD_SIZE, method="bicubic", antialias=True)
+    return tf.clip_by_value(img / 255.0, 0.0, 1.0)
+
+def augment(img):
+    # no flips or crops, they would move pieces to other squares
+    img = tf.image.random_brightness(img, 0.1)
+    img = tf.image.random_contrast(img, 0.9, 1.1)
+    img = tf.image.random_saturation(img, 0.8, 1.2)
+    return tf.clip_by_value(img, 0.0, 1.0)
+
+def make_dataset(paths, labels, training):
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    if training:
+        ds = ds.shuffle(len(paths), seed=SEED, reshuffle_each_iteration=True)
+    ds = ds.map(lambda path, label: (decode_board(path), label), num_parallel_calls=AUTOTUNE, deterministic=not training)
+    if training and AUGMENT:
+        ds = ds.map(lambda img, label: (augment(img), label), num_parallel_calls=AUTOTUNE)
+    return ds.batch(BATCH_SIZE).prefetch(AUTOTUNE)
+
+def conv_block(x, filters, dropout):
+    x = layers.Conv2D(filters, (3, 3), activation="relu", padding="same")(x)
+    x = BatchNormalization()(x)
+    x = layers.Conv2D(filters, (3, 3), activation="relu", padding="same")(x)
+    x = BatchNormalization()(x)
+    x = layers.MaxPooling2D()(x)
+    return layers.Dropout(dropout)(x)
+
+def build_model():
+    inputs = layers.Input(shape=BOARD_SIZE + (3,))
+
+    # Shared backbone, 256 -> 8: every output cell sees one square and its neighbours
+    x = conv_block(inputs, 16, 0.1)
+    x = conv_block(x, 32, 0.1)
+    x = conv_block(x, 64, 0.2)
+    x = conv_block(x, 96, 0.2)
+    x = conv_block(x, 128, 0.3)
+
+    # 1x1 classifier applied to each of the 8x8 cells
+    x = layers.Conv2D(128, (1, 1), activation="relu")(x)
+    outputs = layers.Conv2D(len(SYMBOLS), (1, 1), activation="softmax", name="squares")(x)
+
+    model = models.Model(inputs=inputs, outputs=outputs)
+    model.compile(
+        optimizer="adam",
+        loss="sparse_categorical_crossentropy",
+        metrics=["accuracy"],
+    )
+    return model
+
+def train():
+    paths, labels, _ = list_boards()
+    if not len(paths):
+        raise SystemExit(f"ERROR: no labeled boards in {LABELS_DIR}, run dataset/Synthetic Boards.py first")
+    print(f"✅ Found {len(paths)} boards")
+
+    paths_train, paths_val, labels_train, labels_val = train_test_split(
+        paths, labels, test_size=0.2, random_state=SEED
+    )
+    train_ds = make_dataset(paths_train, labels_train, training=True)
+    val_ds = make_dataset(paths_val, labels_val, training=False)
+
+    model = build_model()
+    model.summary()
+
+    history = model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=EPOCHS,
+        callbacks=[callbacks.EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)],
+    )
+
+    save_path = os.path.join(OUTPUT_DIR, MODEL_NAME)
+    model.save(save_path)
+    print(f"✅ Model saved at {save_path}")
+    return model, history
+
+if __name__ == "__main__":
+    model, history = train()
@@ -1,7 +1,9 @@
 import os
+import json
 import numpy as np
 from PIL import Image
 from pathlib import Path
+import tensorflow as tf
 import tensorflow.python.keras as tf_keras
 from tensorflow.python.keras import layers, models, callbacks
 from sklearn.model_selection import train_test_split
@@ -15,12 +17,19 @@ from trained_models.model_version import VERSION
 
 # Config
 DATASET_DIR = "dataset/flattened_dataset"
+SHARD_DIR = "dataset/shards"    # built by dataset/Build Shards.py, used when present
 OUTPUT_DIR = "trained_models"
 MODEL_NAME = f"chess_piece_color_model{VERSION}.h5"
+SMALL_MODEL_NAME = f"chess_piece_color_model{VERSION}_small.h5"   # first stage of main's cascade mode
+TRAIN_SMALL = True
 IMAGE_SIZE = (128, 128)
+FILTERS = (32, 64, 128)    # one conv block per entry, see build_model
+DENSE_UNITS = 256
 BATCH_SIZE = 32
 EPOCHS = 20
 SEED = 42
+AUGMENT = True
+AUTOTUNE = tf.data.AUTOTUNE
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -35,102 +44,186 @@ colors = ["black", "white"]
 piece_to_idx = {p: i for i, p in enumerate(pieces)}
 color_to_idx = {c: i for i, c in enumerate(colors)}
 
-# TODO: Load dataset
-image_paths, piece_labels, color_labels = [], [], []
+def list_dataset(dataset_dir=DATASET_DIR):
+    image_paths, piece_labels, color_labels = [], [], []
+    for piece in pieces:
+        for color in colors:
+            folder = Path(dataset_dir) / piece / color
+            if not folder.exists():
+                continue
+            for img_file in sorted(folder.glob("*.png")):
+                image_paths.append(str(img_file))
+                piece_labels.append(piece_to_idx[piece])
+                color_labels.append(color_to_idx[color])
+    return np.array(image_paths), np.array(piece_labels, dtype=np.int32), np.array(color_labels, dtype=np.int32)
 
-for piece in pieces:
-    for color in colors:
-        folder = Path(DATASET_DIR) / piece / color
-        if not folder.exists():
-            continue
-        for img_file in folder.glob("*.png"):
-            image_paths.append(str(img_file))
-            piece_labels.append(piece_to_idx[piece])
-            color_labels.append(color_to_idx[color])
-
-print(f"✅ Found {len(image_paths)} images")
-
-# TODO: Convert to numpy arrays
 def load_image(path):
     img = Image.open(path).convert("RGB").resize(IMAGE_SIZE)
     return np.array(img, dtype=np.float32) / 255.0
 
-X = np.array([load_image(p) for p in image_paths], dtype=np.float32)
-y_piece = np.array(piece_labels, dtype=np.int32)
-y_color = np.array(color_labels, dtype=np.int32)
-
-# Split dataset
-X_train, X_val, y_piece_train, y_piece_val, y_color_train, y_color_val = train_test_split(
-    X, y_piece, y_color, test_size=0.2, random_state=SEED, stratify=y_piece
-)
-
-# TODO: Build deeper CNN model (multi-output)
-inputs = layers.Input(shape=IMAGE_SIZE + (3,))
-
-# Layer 1
-x = layers.Conv2D(32, (3, 3), activation="relu", padding="same")(inputs)
-x = BatchNormalization()(x)
-x = layers.Conv2D(32, (3, 3), activation="relu", padding="same")(x)
-x = BatchNormalization()(x)
-x = layers.MaxPooling2D()(x)
-x = layers.Dropout(0.25)(x)
-
-# Layer 2
-x = layers.Conv2D(64, (3, 3), activation="relu", padding="same")(x)
-x = BatchNormalization()(x)
-x = layers.Conv2D(64, (3, 3), activation="relu", padding="same")(x)
-x = BatchNormalization()(x)
-x = layers.MaxPooling2D()(x)
-x = layers.Dropout(0.25)(x)
-
-# Layer 3
-x = layers.Conv2D(128, (3, 3), activation="relu", padding="same")(x)
-x = BatchNormalization()(x)
-x = layers.Conv2D(128, (3, 3), activation="relu", padding="same")(x)
-x = BatchNormalization()(x)
-x = layers.MaxPooling2D()(x)
-x = layers.Dropout(0.4)(x)
-
-# Dense head
-x = layers.Flatten()(x)
-x = layers.Dense(256, activation="relu")(x)
-x = BatchNormalization()(x)
-x = layers.Dropout(0.5)(x)
-
-# Outputs
-piece_output = layers.Dense(len(pieces), activation="softmax", name="piece")(x)
-color_output = layers.Dense(len(colors), activation="softmax", name="color")(x)
-
-model = models.Model(inputs=inputs, outputs=[piece_output, color_output])
-
-model.compile(
-    optimizer="adam",
-    loss={
-        "piece": "sparse_categorical_crossentropy",
-        "color": "sparse_categorical_crossentropy",
-    },
-    metrics={
-        "piece": "accuracy",
-        "color": "accuracy",
-    },
-)
-
-model.summary()
-
-# TODO: Train the model
-history = model.fit(
-    X_train,
-    {"piece": y_piece_train, "color": y_color_train},
-    validation_data=(X_val, {"piece": y_piece_val, "color": y_color_val}),
-    batch_size=BATCH_SIZE,
-    epochs=EPOCHS,
-    callbacks=[callbacks.EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)],
-)
-
-# Save model
-save_path = os.path.join(OUTPUT_DIR, MODEL_NAME)
-model.save(save_path)  # creates a SavedModel directory
-print(f"✅ Model saved at {save_path}")
+def decode_image(path):
+    img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    img = tf.image.resize(img, IMAGE_SIZE, method="bicubic", antialias=True)
+    return tf.clip_by_value(img / 255.0, 0.0, 1.0)
+
+def load_shards(shard_dir=SHARD_DIR):
+    with open(os.path.join(shard_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    if tuple(manifest.get("image_size", ())) != IMAGE_SIZE:
+        raise ValueError(
+            f"the shards in {shard_dir} are {manifest.get('image_size')}, IMAGE_SIZE is {list(IMAGE_SIZE)}; "
+            "rebuild them with dataset/Build Shards.py at the same IMAGE_SIZE"
+        )
+    # memory-mapped, pages are shared between processes reading the same shards
+    shards = [np.load(os.path.join(shard_dir, name), mmap_mode="r") for name in manifest["shards"]]
+    shard_idx = {name: i for i, name in enumerate(manifest["shards"])}
+    slots = np.array([(shard_idx[e["shard"]], e["index"]) for e in manifest["entries"]], dtype=np.int64)
+    y_piece = np.array([e["piece"] for e in manifest["entries"]], dtype=np.int32)
+    y_color = np.array([e["color"] for e in manifest["entries"]], dtype=np.int32)
+
+    def read_slot(slot):
+        img = tf.numpy_function(lambda s: shards[s[0]][s[1]], [slot], tf.uint8)
+        img.set_shape(IMAGE_SIZE + (3,))
+        return tf.cast(img, tf.float32) / 255.0
+
+    return slots, y_piece, y_color, read_slot
+
+def augment(img):
+    img = tf.image.random_flip_left_right(img)
+    img = tf.image.random_brightness(img, 0.1)
+    img = tf.image.random_contrast(img, 0.9, 1.1)
+    return tf.clip_by_value(img, 0.0, 1.0)
+
+def make_dataset(sources, y_piece, y_color, training, load=decode_image, batch_size=BATCH_SIZE):
+    # only file names (or shard slots) live in memory, images are loaded in parallel per batch
+    ds = tf.data.Dataset.from_tensor_slices((sources, {"piece": y_piece, "color": y_color}))
+    if training:
+        ds = ds.shuffle(len(sources), seed=SEED, reshuffle_each_iteration=True)
+    ds = ds.map(lambda source, labels: (load(source), labels), num_parallel_calls=AUTOTUNE, deterministic=not training)
+    if training and AUGMENT:
+        ds = ds.map(lambda img, labels: (augment(img), labels), num_parallel_calls=AUTOTUNE)
+    return ds.batch(batch_size).prefetch(AUTOTUNE)
+
+def build_model(image_size=IMAGE_SIZE, filters=FILTERS, dense_units=DENSE_UNITS):
+    # TODO: Build deeper CNN model (multi-output)
+    inputs = layers.Input(shape=tuple(image_size) + (3,))
+
+    # Conv blocks: two 3x3 convs, then pooling; the last block drops out more
+    x = inputs
+    for i, n in enumerate(filters):
+        x = layers.Conv2D(n, (3, 3), activation="relu", padding="same")(x)
+        x = BatchNormalization()(x)
+        x = layers.Conv2D(n, (3, 3), activation="relu", padding="same")(x)
+        x = BatchNormalization()(x)
+        x = layers.MaxPooling2D()(x)
+        x = layers.Dropout(0.4 if i == len(filters) - 1 else 0.25)(x)
+
+    # Dense head
+    x = layers.Flatten()(x)
+    x = layers.Dense(dense_units, activation="relu")(x)
+    x = BatchNormalization()(x)
+    x = layers.Dropout(0.5)(x)
+
+    # Outputs
+    piece_output = layers.Dense(len(pieces), activation="softmax", name="piece")(x)
+    color_output = layers.Dense(len(colors), activation="softmax", name="color")(x)
+
+    model = models.Model(inputs=inputs, outputs=[piece_output, color_output])
+
+    model.compile(
+        optimizer="adam",
+        loss={
+            "piece": "sparse_categorical_crossentropy",
+            "color": "sparse_categorical_crossentropy",
+        },
+        metrics={
+            "piece": "accuracy",
+            "color": "accuracy",
+        },
+    )
+    return model
+
+def build_small_model():
+    # Cheap first-pass model: same 128x128 input, but pooled to 64x64 straight
+    # away and far fewer filters, so main only escalates its unsure tiles
+    inputs = layers.Input(shape=IMAGE_SIZE + (3,))
+    x = layers.AveragePooling2D()(inputs)
+
+    x = layers.Conv2D(16, (3, 3), activation="relu", padding="same")(x)
+    x = BatchNormalization()(x)
+    x = layers.MaxPooling2D()(x)
+
+    x = layers.Conv2D(32, (3, 3), activation="relu", padding="same")(x)
+    x = BatchNormalization()(x)
+    x = layers.MaxPooling2D()(x)
+
+    x = layers.Conv2D(48, (3, 3), activation="relu", padding="same")(x)
+    x = BatchNormalization()(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.3)(x)
+
+    piece_output = layers.Dense(len(pieces), activation="softmax", name="piece")(x)
+    color_output = layers.Dense(len(colors), activation="softmax", name="color")(x)
+
+    model = models.Model(inputs=inputs, outputs=[piece_output, color_output])
+    model.compile(
+        optimizer="adam",
+        loss={
+            "piece": "sparse_categorical_crossentropy",
+            "color": "sparse_categorical_crossentropy",
+        },
+        metrics={
+            "piece": "accuracy",
+            "color": "accuracy",
+        },
+    )
+    return model
+
+def fit_and_save(model, train_ds, val_ds, model_name):
+    history = model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=EPOCHS,
+        callbacks=[callbacks.EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)],
+    )
+
+    # Save model
+    save_path = os.path.join(OUTPUT_DIR, model_name)
+    model.save(save_path)
+    print(f"✅ Model saved at {save_path}")
+    return history
+
+def train():
+    sources = None
+    if os.path.exists(os.path.join(SHARD_DIR, "manifest.json")):
+        try:
+            sources, y_piece, y_color, load = load_shards()
+            print(f"✅ Found {len(sources)} images in {SHARD_DIR}")
+        except ValueError as exc:
+            print(f"Not using the shards: {exc}")
+    if sources is None:
+        sources, y_piece, y_color = list_dataset()
+        load = decode_image
+        print(f"✅ Found {len(sources)} images")
+
+    # Split the file list, not the pixels
+    sources_train, sources_val, y_piece_train, y_piece_val, y_color_train, y_color_val = train_test_split(
+        sources, y_piece, y_color, test_size=0.2, random_state=SEED, stratify=y_piece
+    )
+    train_ds = make_dataset(sources_train, y_piece_train, y_color_train, training=True, load=load)
+    val_ds = make_dataset(sources_val, y_piece_val, y_color_val, training=False, load=load)
+
+    model = build_model()
+    model.summary()
+
+    # TODO: Train the model
+    history = fit_and_save(model, train_ds, val_ds, MODEL_NAME)
+
+    if TRAIN_SMALL:
+        small_model = build_small_model()
+        small_model.summary()
+        fit_and_save(small_model, train_ds, val_ds, SMALL_MODEL_NAME)
+    return model, history
 
 # Prediction helper
 def predict_image(img_path, model):
@@ -141,5 +234,8 @@ def predict_image(img_path, model):
     color = colors[np.argmax(color_pred[0])]
     return piece, color
 
+if __name__ == "__main__":
+    model, history = train()
+
 # Example:
 # print(predict_image("flattened_dataset/pawn/black/Piece_1.png", model))
\ No newline at end of file
@@ -1,11 +1,13 @@
+import io
 import os
 import traceback
-from PIL import Image
+from hashlib import blake2b
 from typing import List
 import streamlit as st
 from streamlit import markdown as md
 
-from main import generate_board_matrix, matrix_to_fen
+from main import generate_board_matrix, open_board, warmup
+from board import Board
 from trained_models.model_version import VERSION
 
 # TODO: load styles
@@ -13,8 +15,6 @@ def load_css(filepath = "./styles/styles.css"):
     with open(filepath) as file:
         md(f'<style>{file.read()}</style>', unsafe_allow_html=True)
 
-IMAGE_SIZE = (1024, 1024) 
-
 def visualizeBoard(board: List[List[str]]):
     for row in board:
         for cell in row:
@@ -26,6 +26,25 @@ def visualizeBoard(board: List[List[str]]):
 
 # Example boards directory
 EXAMPLES_DIR = "tests"
+SCAN_CACHE_ENTRIES = 512     # scanned boards kept for all sessions, 64 bytes each
+
+# One model for every session and rerun
+@st.cache_resource(show_spinner = "Loading model...")
+def load_model():
+    warmup()
+
+# Board squares by upload content hash: reruns, flips and metadata changes
+# only recompose the FEN. `_data` is not hashed again, `digest` is the key.
+@st.cache_data(max_entries = SCAN_CACHE_ENTRIES, show_spinner = "Scanning board...")
+def scan_board(digest: str, _data: bytes):
+    board_matrix = generate_board_matrix(open_board(io.BytesIO(_data)))
+    return None if board_matrix is None else bytes(Board.from_matrix(board_matrix))
+
+def read_source(image_source) -> bytes:
+    if isinstance(image_source, str):
+        with open(image_source, "rb") as file:
+            return file.read()
+    return image_source.getvalue()
 
 # load_css()
 st.set_page_config(page_title="Chess FEN Scanner", layout="centered")
@@ -69,22 +88,31 @@ en_passant = st.text_input("En passant target square", "-")
 halfmove = st.number_input("Halfmove clock", min_value=0, value=0)
 fullmove = st.number_input("Fullmove number", min_value=1, value=1)
 
+data = read_source(image_source) if image_source else None
+digest = blake2b(data, digest_size = 16).hexdigest() if data else None
+
 # TODO: generate FEN
-if st.button("Generate FEN", use_container_width = True) and image_source:
+# once generated, the FEN of the same image follows every later widget change
+if st.button("Generate FEN", use_container_width = True) and digest:
+    st.session_state["scanned"] = digest
+if digest and st.session_state.get("scanned") == digest:
     try:
-        img = Image.open(image_source).convert("RGB").resize(IMAGE_SIZE)
-        st.image(img, caption = "Selected Image", use_container_width = True)
-        
-        board_matrix = generate_board_matrix(img)
+        st.image(data, caption = "Selected Image", use_container_width = True)
 
-        # Base FEN
-        if is_board_flipped:
-            board_matrix = [row[::-1] for row in board_matrix[::-1]]
-        placement = matrix_to_fen(board_matrix)
+        load_model()
+        squares = scan_board(digest, data)
 
-        if placement is None:
+        if squares is None:
             st.error("Please upload a different image and try again")
         else:
+            # Base FEN
+            position = Board.from_bytes(squares)
+            if is_board_flipped:
+                position = position.flipped()
+            placement = position.to_fen()
+            for problem in position.problems():
+                st.warning(f"Check the scan: {problem}")
+
             final_fen = f"{placement} {'w' if side_to_move == "white" else 'b'} {castling} {en_passant} {halfmove} {fullmove}"
             st.subheader("Generated FEN")
             st.code(final_fen, language="text")
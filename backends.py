@@ -0,0 +1,208 @@
+"""
+Inference backends for the two-head (piece, color) tile model.
+
+Every backend exposes `predict(batch, batch_size = None)` taking a float32
+(N, h, w, 3) array of normalized tiles and returning `(piece_pred, color_pred)`
+probability arrays, so `main` decodes them the same way whatever the runtime.
+
+The "board" backend wraps the whole-board model trained by BoardCNN.py
+instead: `predict_boards(boards)` maps (N, H, W, 3) board images to
+(N, 8, 8, 13) square probabilities, and it is flagged with `whole_board`.
+"""
+
+import numpy as np
+
+from trained_models.model_version import VERSION
+
+MODEL_DIR = "trained_models"
+MODEL_NAME = f"chess_piece_color_model{VERSION}"
+BOARD_MODEL_NAME = f"chess_board_model{VERSION}"
+QUANTIZATIONS = ["float32", "float16", "int8"]
+
+def model_path(backend = "keras", quantization = "float32", small = False):
+    # `small` is the first-stage tile model of main's cascade mode
+    name = f"{MODEL_NAME}_small" if small else MODEL_NAME
+    if backend == "keras":
+        return f"{MODEL_DIR}/{name}.h5"
+    if backend == "board":
+        return f"{MODEL_DIR}/{BOARD_MODEL_NAME}.h5"
+    return f"{MODEL_DIR}/{name}_{quantization}.{backend}"
+
+def _split_heads(outputs):
+    # the piece head has 6 classes and the color head 2, whatever the output order
+    outputs = sorted(outputs, key = lambda out: out.shape[-1], reverse = True)
+    return outputs[0], outputs[1]
+
+def _empty_predictions():
+    # what a batch of no tiles predicts, without running the model
+    return np.zeros((0, 6), dtype = np.float32), np.zeros((0, 2), dtype = np.float32)
+
+def load_keras_model(path):
+    import tensorflow.python.keras as tf_keras
+    from tensorflow.python.keras.models import load_model
+
+    from keras import __version__
+    tf_keras.__version__ = __version__
+
+    return load_model(path)
+
+class CompiledModel:
+    """
+    Calls a Keras model through one traced graph per bucketed batch size,
+    instead of `model.predict` and its per-call data adapter, callbacks and
+    progress bar setup. A batch is zero-padded up to the smallest bucket
+    that fits it (larger batches run in chunks of the largest bucket), so no
+    call ever retraces. All buckets are traced and run once at load time.
+    """
+
+    def __init__(self, model, buckets):
+        import tensorflow as tf
+
+        self.buckets = sorted(buckets)
+        serve = tf.function(lambda batch: model(batch, training = False))
+        input_shape = list(model.input_shape[1:])
+        self.functions = {
+            size: serve.get_concrete_function(tf.TensorSpec([size] + input_shape, tf.float32))
+            for size in self.buckets
+        }
+        for size, function in self.functions.items():
+            outputs = function(tf.zeros([size] + input_shape, tf.float32))
+        outputs = outputs if isinstance(outputs, (list, tuple)) else [outputs]
+        self.empty = [np.zeros((0,) + tuple(out.shape[1:]), dtype = out.dtype.as_numpy_dtype) for out in outputs]
+
+    def _bucket(self, n):
+        for size in self.buckets:
+            if size >= n:
+                return size
+        return self.buckets[-1]
+
+    def __call__(self, batch, batch_size = None):
+        # list of output arrays (one per model output) for the (N, ...) batch
+        if not len(batch):
+            return [out.copy() for out in self.empty]
+        chunk_size = min(batch_size or len(batch), self.buckets[-1])
+        chunks = []
+        for start in range(0, len(batch), chunk_size):
+            chunk = np.asarray(batch[start:start + chunk_size], dtype = np.float32)
+            size = self._bucket(len(chunk))
+            if size != len(chunk):
+                chunk = np.concatenate([chunk, np.zeros((size - len(chunk),) + chunk.shape[1:], dtype = np.float32)])
+            outputs = self.functions[size](chunk)
+            outputs = outputs if isinstance(outputs, (list, tuple)) else [outputs]
+            chunks.append([out.numpy()[:min(chunk_size, len(batch) - start)] for out in outputs])
+        return [np.concatenate(parts) for parts in zip(*chunks)]
+
+# tiles per call: one square, a board after the prefilter, a full board, batch mode; larger batches run in chunks
+TILE_BUCKETS = (1, 8, 32, 64, 256)
+BOARD_BUCKETS = (1, 4, 16)
+
+class KerasBackend:
+    def __init__(self, path, buckets = TILE_BUCKETS):
+        self.model = load_keras_model(path)
+        self.compiled = CompiledModel(self.model, buckets)
+
+    def predict(self, batch, batch_size = None):
+        return _split_heads(self.compiled(batch, batch_size))
+
+class KerasBoardBackend:
+    whole_board = True
+
+    def __init__(self, path, buckets = BOARD_BUCKETS):
+        self.model = load_keras_model(path)
+        self.compiled = CompiledModel(self.model, buckets)
+
+    def predict_boards(self, boards, batch_size = None):
+        return self.compiled(boards, batch_size)[0]
+
+    def predict(self, batch, batch_size = None):
+        raise TypeError("The whole-board model classifies full boards, not tiles: use main.generate_board_matrix()")
+
+def _tflite_interpreter(path, num_threads):
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path = path, num_threads = num_threads)
+
+class TFLiteBackend:
+    def __init__(self, path, num_threads = None):
+        self.interpreter = _tflite_interpreter(path, num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.outputs = self.interpreter.get_output_details()
+        self.batch_size = None
+
+    def _resize(self, batch_size):
+        if batch_size != self.batch_size:
+            shape = [batch_size] + list(self.input["shape"][1:])
+            self.interpreter.resize_tensor_input(self.input["index"], shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = batch_size
+
+    def _quantize(self, batch):
+        scale, zero_point = self.input["quantization"]
+        if self.input["dtype"] == np.float32 or scale == 0:
+            return batch.astype(self.input["dtype"], copy = False)
+        return np.round(batch / scale + zero_point).astype(self.input["dtype"])
+
+    def _output(self, detail):
+        out = self.interpreter.get_tensor(detail["index"])
+        scale, zero_point = detail["quantization"]
+        if detail["dtype"] == np.float32 or scale == 0:
+            return out.astype(np.float32, copy = True)
+        return (out.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch, batch_size = None):
+        if not len(batch):
+            return _empty_predictions()
+        batch_size = batch_size or len(batch)
+        piece_preds, color_preds = [], []
+        for start in range(0, len(batch), batch_size):
+            chunk = batch[start:start + batch_size]
+            self._resize(len(chunk))
+            self.interpreter.set_tensor(self.input["index"], self._quantize(chunk))
+            self.interpreter.invoke()
+            piece_pred, color_pred = _split_heads([self._output(detail) for detail in self.outputs])
+            piece_preds.append(piece_pred)
+            color_preds.append(color_pred)
+        return np.concatenate(piece_preds), np.concatenate(color_preds)
+
+class ONNXBackend:
+    def __init__(self, path, num_threads = None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The onnx backend needs onnxruntime: pip3 install onnxruntime")
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers = ["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch, batch_size = None):
+        if not len(batch):
+            return _empty_predictions()
+        batch_size = batch_size or len(batch)
+        piece_preds, color_preds = [], []
+        for start in range(0, len(batch), batch_size):
+            outputs = self.session.run(None, {self.input_name: batch[start:start + batch_size]})
+            piece_pred, color_pred = _split_heads(outputs)
+            piece_preds.append(piece_pred)
+            color_preds.append(color_pred)
+        return np.concatenate(piece_preds), np.concatenate(color_preds)
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": ONNXBackend,
+    "board": KerasBoardBackend,
+}
+
+def load_backend(name = "keras", path = None, **options):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {list(BACKENDS)}")
+    return BACKENDS[name](path or model_path(name), **options)
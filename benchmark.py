@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+
+Per-stage and end-to-end benchmarks of the scanning pipeline on the tests/
+example boards, written as JSON. A stored run can be used as a baseline to
+flag regressions.
+
+Usage:
+  python3 benchmark.py -o bench.json
+  python3 benchmark.py --compare bench.json --tolerance 0.15
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+import main
+
+IMAGE_SIZE = (1024, 1024)   # same board size as tests.py
+EXAMPLES_DIR = "tests"
+RUNS = 20
+BATCH_SIZES = [64, 256, 1024]
+THREAD_COUNTS = [1, 2, 4]
+BATCH_BOARDS = 32
+
+def time_stage(fn, runs = RUNS, warmup = 1):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000
+    return {
+        "runs": runs,
+        "mean_ms": float(timings.mean()),
+        "median_ms": float(np.median(timings)),
+        "p90_ms": float(np.percentile(timings, 90)),
+        "min_ms": float(timings.min()),
+    }
+
+def example_paths():
+    names = sorted(f for f in os.listdir(EXAMPLES_DIR) if f.lower().endswith((".png", ".jpg", ".jpeg")))
+    return [os.path.join(EXAMPLES_DIR, name) for name in names]
+
+def load_examples():
+    raw = []
+    for path in example_paths():
+        with open(path, "rb") as file:
+            raw.append(file.read())
+    return raw
+
+def decode(data):
+    return Image.open(io.BytesIO(data)).convert("RGB")
+
+def stage_benchmarks(raw, runs):
+    data = raw[0]
+    decoded = decode(data)
+    board = decoded.resize(IMAGE_SIZE)
+    board_arr = np.asarray(board)
+    tiles = main.board_pixels(board)
+    board_matrix = main.generate_board_matrix(board)
+
+    stages = {
+        "decode": time_stage(lambda: decode(data), runs),
+        "resize": time_stage(lambda: decoded.resize(IMAGE_SIZE), runs),
+        "tiling": time_stage(lambda: main.tile_grid(board_arr), runs),
+        "preprocess": time_stage(lambda: main.board_tiles(board), runs),
+        "direct_load": time_stage(lambda: main.load_board_tensor(io.BytesIO(data)), runs),
+    }
+    if main.whole_board_model():
+        # the whole-board model has no per-tile entry points
+        board_input = main.board_array(board)[None]
+        stages["inference"] = time_stage(lambda: main.classify_boards(board_input), runs)
+    else:
+        stages["inference"] = time_stage(lambda: main.classify_tiles(tiles), runs)
+        stages["predict_squares"] = time_stage(lambda: main.predict_squares(tiles), runs)
+    stages["matrix_to_fen"] = time_stage(lambda: main.matrix_to_fen(board_matrix), runs)
+    stages["end_to_end"] = time_stage(lambda: main.matrix_to_fen(main.generate_board_matrix(decode(data).resize(IMAGE_SIZE))), runs)
+    return stages
+
+def throughput_benchmarks(raw, runs, batch_sizes, thread_counts):
+    boards = [decode(raw[i % len(raw)]).resize(IMAGE_SIZE) for i in range(BATCH_BOARDS)]
+    results = {}
+    for batch_size in batch_sizes:
+        stats = time_stage(lambda: main.generate_fen_batch(boards, batch_size = batch_size, max_boards = BATCH_BOARDS), max(1, runs // 4))
+        stats["boards_per_s"] = BATCH_BOARDS / (stats["median_ms"] / 1000)
+        results[f"batch_{batch_size}"] = stats
+    for threads in thread_counts:
+        with ThreadPoolExecutor(max_workers = threads) as pool:
+            stats = time_stage(lambda: list(pool.map(main.generate_board_matrix, boards)), max(1, runs // 4))
+        stats["boards_per_s"] = BATCH_BOARDS / (stats["median_ms"] / 1000)
+        results[f"threads_{threads}"] = stats
+    return results
+
+def pool_benchmarks(runs, worker_counts, threads):
+    # bulk scanning throughput of pool.InferencePool, images are decoded in the workers
+    from pool import InferencePool
+
+    paths = example_paths()
+    paths = [paths[i % len(paths)] for i in range(BATCH_BOARDS * max(worker_counts))]
+    results = {}
+    for workers in worker_counts:
+        with InferencePool(workers, threads, backend = main.BACKEND, path = main.MODEL_PATH) as pool:
+            pool.warmup()
+            stats = time_stage(lambda: list(pool.iter_fens(paths)), max(1, runs // 4))
+        stats["boards_per_s"] = len(paths) / (stats["median_ms"] / 1000)
+        results[f"pool_{workers}x{threads}"] = stats
+    return results
+
+def compare(current, baseline, tolerance):
+    # a stage regresses when its median is more than `tolerance` slower than the baseline
+    regressions = []
+    print(f"{'benchmark':<28}{'baseline ms':>13}{'current ms':>12}{'change':>9}")
+    for group in ("stages", "throughput"):
+        for name, stats in current.get(group, {}).items():
+            base = baseline.get(group, {}).get(name)
+            if base is None:
+                continue
+            change = stats["median_ms"] / base["median_ms"] - 1
+            flag = "  REGRESSION" if change > tolerance else ""
+            print(f"{group + '/' + name:<28}{base['median_ms']:>13.3f}{stats['median_ms']:>12.3f}{change:>+9.1%}{flag}")
+            if flag:
+                regressions.append(f"{group}/{name}")
+    return regressions
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark every stage of the scanning pipeline.")
+    parser.add_argument("-o", "--output", help = "write results as JSON to this file")
+    parser.add_argument("--compare", help = "baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type = float, default = 0.1, help = "allowed slowdown before flagging (0.1 = 10%%)")
+    parser.add_argument("--runs", type = int, default = RUNS)
+    parser.add_argument("--batch-sizes", type = int, nargs = "+", default = BATCH_SIZES)
+    parser.add_argument("--threads", type = int, nargs = "+", default = THREAD_COUNTS)
+    parser.add_argument("--with-cache", action = "store_true", help = "keep the tile cache on (repeated boards become cache hits)")
+    parser.add_argument("--no-filter", action = "store_true", help = "send empty squares to the model too")
+    parser.add_argument("--pool-workers", type = int, nargs = "+", help = "also time bulk scanning with these numbers of worker processes")
+    parser.add_argument("--pool-threads", type = int, default = 1, help = "intra-op threads per worker process")
+    return parser.parse_args(argv)
+
+def run(args):
+    if not args.with_cache:
+        main.set_tile_cache(0)
+    if args.no_filter:
+        main.set_empty_filter(None)
+
+    raw = load_examples()
+    if not raw:
+        print(f"ERROR: no example boards found in {EXAMPLES_DIR}")
+        return 1
+
+    start = time.perf_counter()
+    main.warmup()
+    results = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "backend": main.BACKEND,
+            "model_path": main.MODEL_PATH,
+            "tile_cache": args.with_cache,
+            "empty_filter": main.empty_filter is not None,
+            "model_load_ms": (time.perf_counter() - start) * 1000,
+        },
+        "stages": stage_benchmarks(raw, args.runs),
+        "throughput": throughput_benchmarks(raw, args.runs, args.batch_sizes, args.threads),
+    }
+    if args.pool_workers:
+        results["throughput"].update(pool_benchmarks(args.runs, args.pool_workers, args.pool_threads))
+
+    text = json.dumps(results, indent = 2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+        print(f"✅ Results saved at {args.output}", file = sys.stderr)
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        print("✅ No regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -0,0 +1,149 @@
+"""
+Compact board representation.
+
+A board is 64 uint8 square codes in FEN order (a8..h8, a7..h7, ..., a1..h1),
+0 for an empty square and 1-12 for the pieces of `SYMBOLS`. Batches are
+(N, 64) uint8 arrays, and the functions below work on a whole batch with
+NumPy and str.replace over one joined string instead of per-square Python
+loops. `Board` wraps a single board and converts to and from the
+list-of-lists matrices used by `main`.
+"""
+
+import numpy as np
+
+SYMBOLS = ".PNBRQKpnbrqk"
+EMPTY = 0
+INVALID = 255
+
+_to_ascii = np.frombuffer(SYMBOLS.encode("ascii"), dtype = np.uint8)
+_to_code = np.full(256, INVALID, dtype = np.uint8)
+_to_code[_to_ascii] = np.arange(len(SYMBOLS), dtype = np.uint8)
+
+# FEN rows are 8 squares, plus the "/" separators and one "\n" per board
+_ROW = 9
+_DIGITS = [(str(n), "." * n) for n in range(8, 0, -1)]
+
+# max pieces per side; every piece above the initial count needs a promoted pawn
+_INITIAL = {"P": 8, "N": 2, "B": 2, "R": 2, "Q": 1}
+
+def encode(symbols):
+    # iterable of FEN symbols ("." for empty), 64 per board -> (N, 64) codes
+    codes = _to_code[np.frombuffer("".join(symbols).encode("ascii"), dtype = np.uint8)]
+    if codes.size % 64 or (codes == INVALID).any():
+        raise ValueError("Expected 64 FEN symbols per board")
+    return codes.reshape(-1, 64)
+
+def decode(boards):
+    # (N, 64) codes -> N lists of 64 FEN symbols
+    boards = np.atleast_2d(boards)
+    text = _to_ascii[boards].tobytes().decode("ascii")
+    return [list(text[i:i + 64]) for i in range(0, len(text), 64)]
+
+def flip(boards):
+    # board(s) seen from black's side: reversing the 64 squares rotates by 180 degrees
+    return np.ascontiguousarray(boards[..., ::-1])
+
+def to_fens(boards):
+    # (N, 64) codes -> N FEN placements, runs of empty squares become digits
+    boards = np.atleast_2d(boards)
+    chars = np.empty((len(boards), 8, _ROW), dtype = np.uint8)
+    chars[:, :, :8] = _to_ascii[boards].reshape(-1, 8, 8)
+    chars[:, :, 8] = ord("/")
+    chars[:, -1, 8] = ord("\n")
+    text = chars.tobytes().decode("ascii")
+    for digit, run in _DIGITS:
+        text = text.replace(run, digit)
+    return text.split("\n")[:-1]
+
+def from_fens(placements):
+    # N FEN placements (extra FEN fields are ignored) -> (N, 64) codes
+    text = "\n".join(placement.split(" ", 1)[0] for placement in placements) + "\n"
+    for digit, run in _DIGITS:
+        text = text.replace(digit, run)
+    chars = np.frombuffer(text.encode("ascii"), dtype = np.uint8)
+    if chars.size % (8 * _ROW):
+        raise ValueError("Malformed FEN placement: expected 8 ranks of 8 squares")
+    chars = chars.reshape(-1, 8, _ROW)
+    separators = np.full(8, ord("/"), dtype = np.uint8)
+    separators[-1] = ord("\n")
+    codes = _to_code[chars[:, :, :8]].reshape(-1, 64)
+    if (chars[:, :, 8] != separators).any() or (codes == INVALID).any():
+        raise ValueError("Malformed FEN placement: expected 8 ranks of 8 squares")
+    return codes
+
+def piece_counts(boards):
+    # (N, 64) codes -> (N, 13) number of squares holding each code
+    boards = np.atleast_2d(boards)
+    offsets = np.arange(len(boards))[:, None] * len(SYMBOLS)
+    return np.bincount((boards + offsets).ravel(), minlength = len(boards) * len(SYMBOLS)).reshape(-1, len(SYMBOLS))
+
+def problems(boards):
+    # (N, 64) codes -> {problem: (N,) mask of boards that have it}
+    boards = np.atleast_2d(boards)
+    counts = piece_counts(boards)
+    pawns = (boards == SYMBOLS.index("P")) | (boards == SYMBOLS.index("p"))
+    found = {"pawns on the first or eighth rank": pawns[:, :8].any(axis = 1) | pawns[:, 56:].any(axis = 1)}
+    for side, case in (("white", str.upper), ("black", str.lower)):
+        count = {piece: counts[:, SYMBOLS.index(case(piece))] for piece in "PNBRQK"}
+        promoted = sum(np.maximum(count[piece] - _INITIAL[piece], 0) for piece in "NBRQ")
+        found[f"{side} does not have exactly one king"] = count["K"] != 1
+        found[f"{side} has more than 8 pawns"] = count["P"] > 8
+        found[f"{side} has more than 16 pieces"] = sum(count.values()) > 16
+        found[f"{side} has more promoted pieces than missing pawns"] = promoted > 8 - count["P"]
+    return found
+
+def check(boards):
+    # (N, 64) codes -> (N,) True for boards that pass every piece-count sanity check
+    return ~np.logical_or.reduce(list(problems(boards).values()))
+
+class Board:
+    __slots__ = ("squares",)
+
+    def __init__(self, squares = None):
+        self.squares = np.zeros(64, dtype = np.uint8) if squares is None else np.asarray(squares, dtype = np.uint8).reshape(64)
+
+    @classmethod
+    def from_fen(cls, placement):
+        return cls(from_fens([placement])[0])
+
+    @classmethod
+    def from_matrix(cls, board_matrix):
+        return cls(encode(cell for row in board_matrix for cell in row)[0])
+
+    @classmethod
+    def from_symbols(cls, symbols):
+        return cls(encode(symbols)[0])
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(np.frombuffer(data, dtype = np.uint8))
+
+    def to_fen(self):
+        return to_fens(self.squares)[0]
+
+    def to_matrix(self):
+        symbols = decode(self.squares)[0]
+        return [symbols[row * 8:(row + 1) * 8] for row in range(8)]
+
+    def flipped(self):
+        return Board(self.squares[::-1])
+
+    def piece_counts(self):
+        counts = piece_counts(self.squares)[0]
+        return {symbol: int(n) for symbol, n in zip(SYMBOLS[1:], counts[1:]) if n}
+
+    def problems(self):
+        # human readable reasons this position cannot come from a legal game
+        return [problem for problem, mask in problems(self.squares).items() if mask[0]]
+
+    def __bytes__(self):
+        return self.squares.tobytes()
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and bytes(self) == bytes(other)
+
+    def __hash__(self):
+        return hash(bytes(self))
+
+    def __repr__(self):
+        return f"Board({self.to_fen()!r})"
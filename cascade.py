@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+cascade.py
+
+Two-stage tile classification. The small model trained next to the main one
+in CNN.py (pooled to 64x64, about 20k weights) classifies every tile
+first, and only tiles whose piece or color confidence falls below the
+thresholds are sent to the full model. Tiles the prefilter already marked
+empty never reach either model.
+
+Enable it with `main.set_cascade(Cascade())`, or compare both modes:
+  python3 cascade.py
+  python3 cascade.py --piece-threshold 0.99 --color-threshold 0.95 --styles Neo
+"""
+
+import sys
+import time
+import threading
+import argparse
+import numpy as np
+
+import backends
+import metrics
+
+PIECE_THRESHOLD = 0.98    # escalate tiles whose small-model piece confidence is below this
+COLOR_THRESHOLD = 0.98    # ... or whose color confidence is below this
+
+class Cascade:
+    def __init__(self, piece_threshold = PIECE_THRESHOLD, color_threshold = COLOR_THRESHOLD,
+                 backend = "keras", quantization = "float32", path = None, **options):
+        self.piece_threshold = piece_threshold
+        self.color_threshold = color_threshold
+        self.backend = backend
+        self.path = path or backends.model_path(backend, quantization, small = True)
+        self.options = options
+        self.tiles = 0
+        self.escalated = 0
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = backends.load_backend(self.backend, self.path, **self.options)
+        return self._model
+
+    def predict(self, batch, full_model, batch_size = None):
+        # same contract as a backend: (piece_pred, color_pred) for the (N, h, w, 3) batch
+        piece_pred, color_pred = self.get_model().predict(batch, batch_size)
+        hard = np.flatnonzero((piece_pred.max(axis = 1) < self.piece_threshold) | (color_pred.max(axis = 1) < self.color_threshold))
+        if len(hard):
+            piece_pred[hard], color_pred[hard] = full_model.predict(batch[hard], batch_size)
+        self.tiles += len(batch)
+        self.escalated += len(hard)
+        metrics.count("tiles", "escalated", len(hard))
+        return piece_pred, color_pred
+
+    def reset_stats(self):
+        self.tiles = self.escalated = 0
+
+    def stats(self):
+        return {
+            "tiles": self.tiles,
+            "escalated": self.escalated,
+            "escalation_rate": self.escalated / self.tiles if self.tiles else 0.0,
+        }
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Compare cascade mode with the full model alone.")
+    parser.add_argument("--piece-threshold", type = float, default = PIECE_THRESHOLD)
+    parser.add_argument("--color-threshold", type = float, default = COLOR_THRESHOLD)
+    parser.add_argument("--model-path", help = "full model file (default: the keras model in trained_models)")
+    parser.add_argument("--small-model", help = "first-stage model file (default: the _small .h5 next to the main model)")
+    parser.add_argument("--styles", nargs = "+", help = "only these styles (default: all)")
+    return parser.parse_args(argv)
+
+def run(args):
+    import main
+    import board
+    import evaluate
+    from examples import examples
+
+    # tiles of every dataset theme (as in evaluate.py) and the example boards
+    tiles, expected = [], []
+    for _, theme_tiles, codes in map(evaluate.load_theme, *zip(*evaluate.find_themes(args.styles))):
+        tiles.append(theme_tiles.astype(np.float32) / np.float32(255.0))
+        expected.append(codes)
+    tiles, expected = np.concatenate(tiles), np.array(list(board.SYMBOLS))[np.concatenate(expected)]
+    boards = [main.open_board(path) for path, _, _ in examples]
+    flips = [is_flipped for _, is_flipped, _ in examples]
+    placements = [placement for _, _, placement in examples]
+
+    main.set_backend("keras", path = args.model_path)
+    main.set_tile_cache(0)
+    cascade = Cascade(args.piece_threshold, args.color_threshold, path = args.small_model)
+    print("---- CASCADE ----")
+    print(f"Thresholds : piece < {cascade.piece_threshold}, color < {cascade.color_threshold}")
+    for name, active in (("full model", None), ("cascade", cascade)):
+        main.set_cascade(active)
+        main.warmup()
+        cascade.reset_stats()
+
+        start = time.perf_counter()
+        predicted = np.array(main.classify_tiles(tiles))
+        elapsed = time.perf_counter() - start
+        escalation = f", {cascade.stats()['escalation_rate']:.1%} escalated" if active else ""
+        print(f"Tiles ({name}) : accuracy {np.mean(predicted == expected):.4f}, "
+              f"{elapsed / len(tiles) * 1000:.3f} ms/tile{escalation}")
+
+        cascade.reset_stats()
+        fens = main.generate_fen_batch(boards, flips)
+        escalation = f", {cascade.stats()['escalation_rate']:.1%} of model tiles escalated" if active else ""
+        print(f"Boards ({name}) : FEN accuracy {np.mean([fen == placement for fen, placement in zip(fens, placements)]):.4f}{escalation}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Build Shards.py
+
+Preprocess:
+  flattened_dataset/{piece}/{color}/Piece_n.png
+into uint8 memory-mappable shards:
+  shards/shard_k.npy       (N, 128, 128, 3) RGB tiles, already resized
+  shards/manifest.json     labels, source paths, content hashes and shard slots
+
+Re-running only decodes files that were added or changed since the last
+build; their tiles go into a new shard and stale slots are dropped from the
+manifest. Use --compact to rewrite everything into fresh shards.
+
+Usage:
+  python3 "Build Shards.py"
+  python3 "Build Shards.py" --compact
+"""
+
+from pathlib import Path
+from hashlib import blake2b
+from concurrent.futures import ThreadPoolExecutor
+import argparse, json, os, sys
+import numpy as np
+from PIL import Image
+
+# ----------- CONFIG -------------
+CURRENT_DIR = Path(__file__).resolve().parent
+SRC_DIR = CURRENT_DIR / "flattened_dataset"    # <-- flattened dataset root
+DST_DIR = CURRENT_DIR / "shards"               # <-- shard output directory
+IMAGE_SIZE = (128, 128)                        # must match training
+SHARD_SIZE = 1024                              # tiles per shard file
+THREADS = os.cpu_count() or 4
+PIECES = ["pawn", "rook", "knight", "bishop", "queen", "king"]
+COLORS = ["black", "white"]
+# ---------------------------------
+
+MANIFEST = DST_DIR / "manifest.json"
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return blake2b(f.read(), digest_size=16).hexdigest()
+
+def load_tile(path):
+    img = Image.open(path).convert("RGB").resize(IMAGE_SIZE)
+    return np.asarray(img, dtype=np.uint8)
+
+def scan_sources():
+    sources = []
+    for piece_idx, piece in enumerate(PIECES):
+        for color_idx, color in enumerate(COLORS):
+            folder = SRC_DIR / piece / color
+            if not folder.exists():
+                continue
+            for f in sorted(folder.glob("*.png")):
+                sources.append((f.relative_to(SRC_DIR).as_posix(), piece_idx, color_idx))
+    return sources
+
+def load_manifest():
+    if MANIFEST.exists():
+        with open(MANIFEST) as f:
+            manifest = json.load(f)
+        if manifest.get("image_size") == list(IMAGE_SIZE):
+            return manifest
+        print("Image size changed, rebuilding every shard")
+    return {"image_size": list(IMAGE_SIZE), "shards": [], "entries": []}
+
+def write_shards(pending, manifest):
+    # pending: list of entries without a slot yet; writes them in SHARD_SIZE chunks
+    next_id = max((int(name[6:-4]) for name in manifest["shards"]), default=-1) + 1
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        for start in range(0, len(pending), SHARD_SIZE):
+            chunk = pending[start:start + SHARD_SIZE]
+            name = f"shard_{next_id}.npy"
+            next_id += 1
+            shard = np.lib.format.open_memmap(DST_DIR / name, mode="w+", dtype=np.uint8,
+                                              shape=(len(chunk),) + IMAGE_SIZE[::-1] + (3,))
+            for i, tile in enumerate(pool.map(load_tile, [SRC_DIR / e["path"] for e in chunk])):
+                shard[i] = tile
+            shard.flush()
+            del shard
+            for i, entry in enumerate(chunk):
+                entry["shard"] = name
+                entry["index"] = i
+            manifest["shards"].append(name)
+            print(f"Wrote {name} ({len(chunk)} tiles)")
+
+def main(compact=False):
+    if not SRC_DIR.exists():
+        print(f"ERROR: source directory does not exist: {SRC_DIR}")
+        return 1
+    DST_DIR.mkdir(parents=True, exist_ok=True)
+
+    manifest = {"image_size": list(IMAGE_SIZE), "shards": [], "entries": []} if compact else load_manifest()
+    known = {e["path"]: e for e in manifest["entries"]}
+
+    entries, pending = [], []
+    reused = 0
+    for rel_path, piece_idx, color_idx in scan_sources():
+        src = SRC_DIR / rel_path
+        stat = src.stat()
+        old = known.get(rel_path)
+        if old and old["size"] == stat.st_size and old["mtime"] == stat.st_mtime_ns:
+            entry, digest = old, old["hash"]
+        else:
+            digest = file_hash(src)
+            entry = old if old and old["hash"] == digest else None
+        if entry is not None:
+            entry.update(piece=piece_idx, color=color_idx, size=stat.st_size, mtime=stat.st_mtime_ns)
+            entries.append(entry)
+            reused += 1
+            continue
+        entry = {"path": rel_path, "piece": piece_idx, "color": color_idx,
+                 "hash": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+        entries.append(entry)
+        pending.append(entry)
+
+    write_shards(pending, manifest)
+    manifest["entries"] = entries
+
+    # drop shards no entry points to any more
+    live = {e["shard"] for e in entries}
+    for name in list(manifest["shards"]):
+        if name not in live:
+            (DST_DIR / name).unlink(missing_ok=True)
+            manifest["shards"].remove(name)
+    for stray in DST_DIR.glob("shard_*.npy"):
+        if stray.name not in live:
+            stray.unlink()
+
+    tmp = MANIFEST.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, MANIFEST)
+
+    print("---- SUMMARY ----")
+    print(f"Source root : {SRC_DIR}")
+    print(f"Destination : {DST_DIR}")
+    print(f"Tiles reused : {reused}")
+    print(f"Tiles added or changed : {len(pending)}")
+    print(f"Shards : {len(manifest['shards'])}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build memory-mapped uint8 shards of the flattened dataset.")
+    parser.add_argument("--compact", action="store_true", help="rewrite every tile into fresh shards")
+    sys.exit(main(parser.parse_args().compact))
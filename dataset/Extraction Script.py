@@ -1,11 +1,14 @@
 import os
+import sys
+import json
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
-# Input image path
-style_name = "Collins"
-theme = "Brown"
 current_dir = os.path.dirname(os.path.abspath(__file__))
-input_image = os.path.join(current_dir, f"Board/{style_name}/{theme}.png")
+BOARD_DIR = os.path.join(current_dir, "Board")      # Board/{style}/{theme}.png
+OUTPUT_DIR = os.path.join(current_dir, "Pieces")    # Pieces/{style}/{theme}/{piece}/{color}/Piece_n.png
 
 # Piece mapping according to standard chess notation
 piece_map = {
@@ -17,48 +20,70 @@ piece_map = {
     "K": "king"
 }
 
-# Initial board placement (FEN format equivalent)
-initial_board = [
-    ["r", "n", "b", "q", "k", "b", "n", "r"],  # 8th rank (black back row)
-    ["p"] * 3 + ["K", "Q"] + ["p"] * 3,        # 7th rank (black pawns)
-    [None] * 8,                                # 6th
-    [None] * 8,                                # 5th
-    [None] * 8,                                # 4th
-    [None] * 8,                                # 3rd
-    ["P"] * 3 + ["k", "q"] + ["P"] * 3,        # 2nd rank (white pawns)
-    ["R", "N", "B", "Q", "K", "B", "N", "R"],  # 1st rank (white back row)
-]
-
-# Function to save extracted piece
-def save_piece(img, piece_name, color, count):
-    folder_path = f"Pieces/{style_name}/{theme}/{piece_name}/{color}"
-    os.makedirs(folder_path, exist_ok=True)
-    file_path = f"{folder_path}/Piece_{count}.png"
-    img.save(file_path)
-
-# Load image
-image = Image.open(input_image)
-width, height = image.size
-
-# Each square size
-square_w = width // 8
-square_h = height // 8
-
-# Counters for each piece
-piece_counters = {}
-pawn_squares_saved = {
-    "black": {"dark": False, "light": False},
-    "white": {"dark": False, "light": False}
-}
+# Layout of the board screenshots (FEN placement); the 7th and 2nd ranks
+# carry an extra king and queen of the opposite color on d/e
+DEFAULT_LAYOUT = "rnbqkbnr/pppKQppp/8/8/8/8/PPPkqPPP/RNBQKBNR"
+
+# Per-board overrides, keyed by "{style}/{theme}"
+LAYOUTS = {}
+
+def parse_layout(fen):
+    board = []
+    for fen_row in fen.split()[0].split("/"):
+        row = []
+        for cell in fen_row:
+            if cell.isdigit():
+                row.extend([None] * int(cell))
+            elif cell.upper() in piece_map:
+                row.append(cell)
+            else:
+                raise ValueError(f"Invalid piece {cell!r} in layout {fen!r}")
+        if len(row) != 8:
+            raise ValueError(f"Rank {fen_row!r} of layout {fen!r} does not have 8 squares")
+        board.append(row)
+    if len(board) != 8:
+        raise ValueError(f"Layout {fen!r} does not have 8 ranks")
+    return board
 
 # Function to check square color (dark or light)
 square_color = lambda row, col: "dark" if (row + col) % 2 == 1 else "light"
 
-# Loop through the board and extract pieces
-for row in range(8):
-    for col in range(8):
-        piece = initial_board[row][col]
-        if piece:
+def find_boards(styles = None):
+    boards = []
+    for path in sorted(glob.glob(os.path.join(BOARD_DIR, "*", "*.png"))):
+        style_name = os.path.basename(os.path.dirname(path))
+        theme = os.path.splitext(os.path.basename(path))[0]
+        if styles and style_name not in styles:
+            continue
+        boards.append((style_name, theme, path))
+    return boards
+
+def extract_board(style_name, theme, input_image, layout):
+    initial_board = parse_layout(layout)
+
+    # Load image
+    image = Image.open(input_image)
+    width, height = image.size
+
+    # Each square size
+    square_w = width // 8
+    square_h = height // 8
+
+    # Counters for each piece
+    piece_counters = {}
+    pawn_squares_saved = {
+        "black": {"dark": False, "light": False},
+        "white": {"dark": False, "light": False}
+    }
+
+    # Loop through the board and extract pieces
+    saved = 0
+    for row in range(8):
+        for col in range(8):
+            piece = initial_board[row][col]
+            if not piece:
+                continue
+
             # Determine color
             color = "black" if piece.islower() else "white"
             piece_name = piece_map[piece.upper()]
@@ -75,9 +100,7 @@ for row in range(8):
             # Crop the square
             left = col * square_w
             upper = row * square_h
-            right = left + square_w
-            lower = upper + square_h
-            cropped = image.crop((left, upper, right, lower))
+            cropped = image.crop((left, upper, left + square_w, upper + square_h))
 
             # Track number
             piece_counters.setdefault((piece_name, color), 0)
@@ -85,6 +108,46 @@ for row in range(8):
             count = piece_counters[(piece_name, color)]
 
             # Save the piece
-            save_piece(cropped, piece_name, color, count)
+            folder_path = os.path.join(OUTPUT_DIR, style_name, theme, piece_name, color)
+            os.makedirs(folder_path, exist_ok = True)
+            cropped.save(os.path.join(folder_path, f"Piece_{count}.png"))
+            saved += 1
+
+    return style_name, theme, saved
+
+def main(args):
+    layouts = dict(LAYOUTS)
+    if args.layouts:
+        with open(args.layouts) as file:
+            layouts.update(json.load(file))
+    default_layout = args.layout or DEFAULT_LAYOUT
+
+    boards = find_boards(args.styles)
+    if not boards:
+        print(f"ERROR: no board images found under {BOARD_DIR}")
+        return 1
+
+    jobs = [
+        (style_name, theme, path, layouts.get(f"{style_name}/{theme}", default_layout))
+        for style_name, theme, path in boards
+    ]
+    # validate every layout before starting the pool
+    for _, _, _, layout in jobs:
+        parse_layout(layout)
+
+    with ProcessPoolExecutor(max_workers = args.workers) as pool:
+        futures = [pool.submit(extract_board, *job) for job in jobs]
+        for future in futures:
+            style_name, theme, saved = future.result()
+            print(f"{style_name}/{theme}: {saved} pieces saved")
+
+    print(f"✅ Extraction completed for {len(jobs)} boards! Only 1 pawn per color and square color saved.")
+    return 0
 
-print("✅ Extraction completed! Only 1 pawn per color saved.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Extract piece images from every board screenshot under Board/.")
+    parser.add_argument("--styles", nargs = "+", help = "only these styles (default: all)")
+    parser.add_argument("--layout", help = f"FEN placement of every board (default: {DEFAULT_LAYOUT})")
+    parser.add_argument("--layouts", help = 'JSON file of per-board layouts, e.g. {"Neo/Blue": "<fen>"}')
+    parser.add_argument("--workers", type = int, default = None, help = "worker processes (default: CPU count)")
+    sys.exit(main(parser.parse_args()))
@@ -7,17 +7,28 @@ Copy (not move) images from:
 into:
   flattened_dataset/{piece}/{color}/Piece_n.png
 
+Runs are incremental and idempotent: a manifest in the destination records
+which source went to which file (with its content hash), so unchanged
+sources are skipped and changed ones overwrite their earlier copy. A
+destination without a manifest has its existing files matched to the
+sources by content hash, so they are not copied a second time.
+
 Usage:
   python3 "Flat Folder.py"
 """
 
 from pathlib import Path
-import shutil, re, sys
+from hashlib import blake2b
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json, os, shutil, re, sys
 
 # ----------- CONFIG -------------
 SRC_DIR = Path("")                      # <-- original nested dataset root
 DST_DIR = Path("flattened_dataset")     # <-- flattened copy destination
 DRY_RUN = False                         # True = don't actually copy, just print actions
+LINK_MODE = "copy"                      # "copy" or "hardlink" (falls back to copy across devices)
+THREADS = 8                             # parallel copies
+MANIFEST_NAME = ".flatten_manifest.json"  # source -> destination mapping, stored in DST_DIR
 # Allowed image extensions (lowercase)
 ALLOWED_EXT = {".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff"}
 # Expected piece/color names (lowercase)
@@ -27,6 +38,7 @@ COLORS = {"black", "white"}
 
 SRC_DIR = SRC_DIR.expanduser().resolve()
 DST_DIR = DST_DIR.expanduser().resolve()
+MANIFEST = DST_DIR / MANIFEST_NAME
 
 if not SRC_DIR.exists():
     print(f"ERROR: source directory does not exist: {SRC_DIR}")
@@ -34,75 +46,155 @@ if not SRC_DIR.exists():
 
 DST_DIR.mkdir(parents=True, exist_ok=True)
 
-# Initialize counters from existing files in DST_DIR (so repeated runs don't overwrite)
+def file_hash(path):
+    h = blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def place(src, dst):
+    tmp = dst.with_name(dst.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    if LINK_MODE == "hardlink":
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copy2(src, tmp)   # e.g. across file systems
+    else:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+# Manifest of earlier runs: source -> destination, content hash and stat
+if MANIFEST.exists():
+    with open(MANIFEST) as f:
+        manifest = json.load(f)
+else:
+    manifest = {"files": {}, "counters": {}}
+
+# Initialize counters (so repeated runs don't overwrite); without a manifest
+# fall back to the numbers already present in DST_DIR
 counter = {}
+existing = []
 for piece in PIECES:
     for color in COLORS:
+        key = f"{piece}/{color}"
+        if key in manifest["counters"]:
+            counter[(piece, color)] = manifest["counters"][key]
+            continue
+        nums = [0]
         d = DST_DIR / piece / color
         if d.exists():
-            nums = []
-            for f in d.iterdir():
-                if not f.is_file(): 
-                    continue
+            for f in sorted(d.iterdir()):
                 m = re.search(r'Piece_(\d+)', f.name)
-                if m:
+                if f.is_file() and m:
                     nums.append(int(m.group(1)))
-            counter[(piece, color)] = max(nums) if nums else 0
-        else:
-            counter[(piece, color)] = 0
+                    existing.append((piece, color, f))
+        counter[(piece, color)] = max(nums)
+
+# Without a manifest, files already in DST_DIR (e.g. from a run before the
+# manifest existed) are adopted by content hash instead of being copied again
+adoptable = {}
+if not MANIFEST.exists():
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        for (piece, color, f), digest in zip(existing, pool.map(lambda e: file_hash(e[2]), existing)):
+            adoptable.setdefault((piece, color, digest), []).append(f.relative_to(DST_DIR).as_posix())
 
 files_found = 0
 files_copied = 0
+files_unchanged = 0
+files_adopted = 0
 files_skipped = 0
 copied_examples = []
 skipped_examples = []
+jobs = []
+seen = set()
+
+# Walk recursively (never into DST_DIR) and find files whose path contains "<piece>/<color>/..."
+for root, dirs, names in os.walk(SRC_DIR):
+    root = Path(root)
+    dirs[:] = sorted(d for d in dirs if (root / d).resolve() != DST_DIR)
+    for name in sorted(names):
+        file = root / name
+        if file.suffix.lower() not in ALLOWED_EXT:
+            continue
+
+        parts = [p.strip().lower() for p in file.relative_to(SRC_DIR).parts]  # normalize
+        # look for a segment that is a piece and the next segment a color
+        matched = False
+        for i in range(len(parts) - 1):
+            if parts[i] in PIECES and parts[i + 1] in COLORS:
+                piece = parts[i]
+                color = parts[i + 1]
+                matched = True
+                break
+
+        if not matched:
+            files_skipped += 1
+            if len(skipped_examples) < 5:
+                skipped_examples.append(str(file))
+            continue
+
+        files_found += 1
+        rel = file.relative_to(SRC_DIR).as_posix()
+        seen.add(rel)
+        stat = file.stat()
+        entry = manifest["files"].get(rel)
+
+        # Unchanged since the last run -> nothing to do
+        if entry and (DST_DIR / entry["dst"]).exists():
+            if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                files_unchanged += 1
+                continue
+            digest = file_hash(file)
+            if entry["hash"] == digest:
+                entry.update(size=stat.st_size, mtime=stat.st_mtime_ns)
+                files_unchanged += 1
+                continue
+        else:
+            digest = file_hash(file)
+            adopted = adoptable.get((piece, color, digest))
+            if not entry and adopted:
+                manifest["files"][rel] = {"dst": adopted.pop(0), "hash": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+                files_adopted += 1
+                continue
+
+        if entry and entry["dst"].startswith(f"{piece}/{color}/"):
+            dst_rel = entry["dst"]   # changed file keeps its destination name
+        else:
+            counter[(piece, color)] += 1
+            dst_rel = f"{piece}/{color}/Piece_{counter[(piece, color)]}{file.suffix.lower()}"
+        manifest["files"][rel] = {"dst": dst_rel, "hash": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+        jobs.append((file, DST_DIR / dst_rel))
 
-# Walk recursively and find files whose path contains "<piece>/<color>/..."
-for file in SRC_DIR.rglob("*"):
-    if not file.is_file():
-        continue
-    if file.suffix.lower() not in ALLOWED_EXT:
-        continue
-
-    parts = [p.strip().lower() for p in file.parts]  # normalize
-    # look for a segment that is a piece and the next segment a color
-    matched = False
-    for i in range(len(parts) - 1):
-        if parts[i] in PIECES and parts[i + 1] in COLORS:
-            piece = parts[i]
-            color = parts[i + 1]
-            matched = True
-            break
-
-    if not matched:
-        files_skipped += 1
-        if len(skipped_examples) < 5:
-            skipped_examples.append(str(file))
-        continue
-
-    files_found += 1
-
-    dst_dir = DST_DIR / piece / color
-    dst_dir.mkdir(parents=True, exist_ok=True)
-
-    counter[(piece, color)] += 1
-    dst_name = f"Piece_{counter[(piece, color)]}{file.suffix.lower()}"
-    dst_path = dst_dir / dst_name
-
-    if DRY_RUN:
+if DRY_RUN:
+    for file, dst_path in jobs:
         print(f"[DRY] {file} -> {dst_path}")
-        files_copied += 1
-        if len(copied_examples) < 5:
-            copied_examples.append(str(dst_path))
-        continue
-
-    try:
-        shutil.copy2(file, dst_path)
-        files_copied += 1
-        if len(copied_examples) < 5:
-            copied_examples.append(str(dst_path))
-    except Exception as e:
-        print(f"Failed to copy {file} -> {dst_path}: {e}")
+    files_copied = len(jobs)
+    copied_examples = [str(dst_path) for _, dst_path in jobs[:5]]
+else:
+    for _, dst_path in jobs:
+        dst_path.parent.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        futures = {pool.submit(place, file, dst_path): (file, dst_path) for file, dst_path in jobs}
+        for future in as_completed(futures):
+            file, dst_path = futures[future]
+            try:
+                future.result()
+                files_copied += 1
+                if len(copied_examples) < 5:
+                    copied_examples.append(str(dst_path))
+            except Exception as e:
+                print(f"Failed to copy {file} -> {dst_path}: {e}")
+                manifest["files"].pop(file.relative_to(SRC_DIR).as_posix(), None)
+
+    manifest["counters"] = {f"{piece}/{color}": n for (piece, color), n in counter.items()}
+    tmp = MANIFEST.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, MANIFEST)
+
+files_removed = len(set(manifest["files"]) - seen)
 
 # Summary
 print("---- SUMMARY ----")
@@ -110,6 +202,11 @@ print(f"Source root : {SRC_DIR}")
 print(f"Destination : {DST_DIR}")
 print(f"Files matching piece/color pattern : {files_found}")
 print(f"Files copied : {files_copied}")
+print(f"Files unchanged since last run : {files_unchanged}")
+if files_adopted:
+    print(f"Files already in destination (adopted) : {files_adopted}")
+if files_removed:
+    print(f"Sources missing since last run (destinations kept) : {files_removed}")
 print(f"Files skipped (didn't match expected folders) : {files_skipped}")
 if copied_examples:
     print("Examples copied:")
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Synthetic Boards.py
+
+Render random, legal-looking positions by compositing the piece sprites from:
+  Pieces/{style}/{theme}/{piece}/{color}/Piece_n.png
+onto the empty squares of:
+  Board/{style}/{theme}.png
+and write labeled training data:
+  synthetic/{piece}/{color}/Piece_n.png    occupied tiles (same layout as flattened_dataset)
+  synthetic/empty/Piece_n.png              empty tiles
+  synthetic/boards/Board_n.png             full boards
+  synthetic/boards/labels_k.jsonl          {"image", "fen", "style", "theme"} per board
+
+Sprites are cut out of their own square with a mask of the pixels that differ
+from that theme's empty square, and a whole board is composited with one
+vectorized np.where over its 64 tiles. Boards are split across a process pool.
+
+Usage:
+  python3 "Synthetic Boards.py" --boards 10000
+  python3 "Synthetic Boards.py" --boards 500 --styles Neo --no-tiles
+"""
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import argparse, glob, json, sys
+import numpy as np
+from PIL import Image
+
+# ----------- CONFIG -------------
+CURRENT_DIR = Path(__file__).resolve().parent
+BOARD_DIR = CURRENT_DIR / "Board"
+PIECES_DIR = CURRENT_DIR / "Pieces"
+DST_DIR = CURRENT_DIR / "synthetic"
+EMPTY_ROWS = range(2, 6)       # ranks 6-3 are empty on every board screenshot
+MASK_TOLERANCE = 40            # max channel difference still counted as background
+MASK_BORDER = 3                # pixels at the sprite edge never taken (board frame lines)
+CHUNK = 250                    # boards per worker task
+SEED = 42
+# ---------------------------------
+
+sys.path.insert(0, str(CURRENT_DIR.parent))
+import board as board_codes   # FEN encoding of the repo root's board.py
+
+PIECES = {"p": "pawn", "r": "rook", "n": "knight", "b": "bishop", "q": "queen", "k": "king"}
+# Pieces each side can have besides its king
+ARMY = list("pppppppprrnnbbq")
+
+def load_theme(style, theme):
+    board = np.asarray(Image.open(BOARD_DIR / style / f"{theme}.png").convert("RGB"))
+    # crop to a square 8x8 grid: some screenshots are a pixel short (Collins/Brown is 1200x1199)
+    h = w = min(board.shape[:2]) // 8
+    grid = board[:h * 8, :w * 8].reshape(8, h, 8, w, 3).swapaxes(1, 2)
+
+    # empty squares by square color: 0 = light, 1 = dark
+    backgrounds = [[], []]
+    for row in EMPTY_ROWS:
+        for col in range(8):
+            backgrounds[(row + col) % 2].append(grid[row, col])
+    backgrounds = [np.stack(tiles) for tiles in backgrounds]
+    reference = [np.median(tiles, axis=0) for tiles in backgrounds]
+
+    sprites, masks, by_symbol = [], [], {}
+    for symbol, piece in PIECES.items():
+        for color, fen in (("black", symbol), ("white", symbol.upper())):
+            for path in sorted(glob.glob(str(PIECES_DIR / style / theme / piece / color / "*.png"))):
+                sprite = Image.open(path).convert("RGB")
+                if sprite.size != (w, h):
+                    sprite = sprite.resize((w, h))
+                sprite = np.asarray(sprite)
+                # the sprite was cut from whichever square color its corners match
+                corners = sprite[[0, 0, -1, -1], [0, -1, 0, -1]].astype(np.float32)
+                parity = int(np.argmin([np.abs(corners - ref[[0, 0, -1, -1], [0, -1, 0, -1]]).mean() for ref in reference]))
+                mask = np.abs(sprite.astype(np.int16) - reference[parity]).max(axis=-1) > MASK_TOLERANCE
+                mask[:MASK_BORDER] = mask[-MASK_BORDER:] = False
+                mask[:, :MASK_BORDER] = mask[:, -MASK_BORDER:] = False
+                sprites.append(sprite)
+                masks.append(mask[..., None])
+                by_symbol.setdefault(fen, []).append(len(sprites) - 1)
+    return backgrounds, np.stack(sprites), np.stack(masks), by_symbol
+
+def random_position(rng):
+    # returns 64 FEN symbols ("." for empty) with one king each, no pawns on the back ranks
+    # and the kings never on adjacent squares
+    cells = np.full(64, ".", dtype="<U1")
+    while True:
+        white_king, black_king = rng.choice(64, 2, replace=False)
+        if max(abs(white_king // 8 - black_king // 8), abs(white_king % 8 - black_king % 8)) > 1:
+            break
+    cells[white_king], cells[black_king] = "K", "k"
+
+    army = [symbol.upper() for symbol in rng.permutation(ARMY)[:rng.integers(0, len(ARMY) + 1)]]
+    army += list(rng.permutation(ARMY)[:rng.integers(0, len(ARMY) + 1)])
+    free = [square for square in rng.permutation(64) if cells[square] == "."]
+    for symbol in army:
+        for i, square in enumerate(free):
+            if symbol.lower() != "p" or 8 <= square < 56:
+                cells[square] = symbol
+                del free[i]
+                break
+    return cells
+
+def render(theme_data, cells, rng):
+    backgrounds, sprites, masks, by_symbol = theme_data
+    parity = (np.arange(64) // 8 + np.arange(64) % 8) % 2
+    tiles = np.empty((64,) + sprites.shape[1:], dtype=np.uint8)
+    for p in (0, 1):
+        squares = np.flatnonzero(parity == p)
+        tiles[squares] = backgrounds[p][rng.integers(0, len(backgrounds[p]), len(squares))]
+
+    occupied = np.flatnonzero(cells != ".")
+    picks = np.array([rng.choice(by_symbol[cells[square]]) for square in occupied], dtype=np.int64)
+    if len(picks):
+        tiles[occupied] = np.where(masks[picks], sprites[picks], tiles[occupied])
+    return tiles
+
+def render_chunk(task):
+    chunk_id, start, count, themes, write_tiles, seed = task
+    rng = np.random.default_rng([seed, chunk_id])
+    cache = {}
+    boards_dir = DST_DIR / "boards"
+    labels = []
+    for n in range(start, start + count):
+        style, theme = themes[rng.integers(0, len(themes))]
+        if (style, theme) not in cache:
+            cache[(style, theme)] = load_theme(style, theme)
+        theme_data = cache[(style, theme)]
+
+        cells = random_position(rng)
+        tiles = render(theme_data, cells, rng)
+        h, w = tiles.shape[1:3]
+        board = tiles.reshape(8, 8, h, w, 3).swapaxes(1, 2).reshape(8 * h, 8 * w, 3)
+        name = f"Board_{n}.png"
+        Image.fromarray(board).save(boards_dir / name, compress_level=1)
+        labels.append({"image": name, "fen": board_codes.to_fens(board_codes.encode(cells))[0], "style": style, "theme": theme})
+
+        if write_tiles:
+            for square, cell in enumerate(cells):
+                if cell == ".":
+                    folder = DST_DIR / "empty"
+                else:
+                    folder = DST_DIR / PIECES[cell.lower()] / ("white" if cell.isupper() else "black")
+                Image.fromarray(tiles[square]).save(folder / f"Piece_{n * 64 + square}.png", compress_level=1)
+
+    with open(boards_dir / f"labels_{chunk_id}.jsonl", "w") as f:
+        for label in labels:
+            f.write(json.dumps(label) + "\n")
+    return count
+
+def find_themes(styles=None):
+    themes = []
+    for path in sorted(BOARD_DIR.glob("*/*.png")):
+        style, theme = path.parent.name, path.stem
+        if styles and style not in styles:
+            continue
+        if (PIECES_DIR / style / theme).exists():
+            themes.append((style, theme))
+    return themes
+
+def main(args):
+    themes = find_themes(args.styles)
+    if not themes:
+        print(f"ERROR: no board/piece themes found under {BOARD_DIR} and {PIECES_DIR}")
+        return 1
+
+    (DST_DIR / "boards").mkdir(parents=True, exist_ok=True)
+    if not args.no_tiles:
+        (DST_DIR / "empty").mkdir(parents=True, exist_ok=True)
+        for piece in PIECES.values():
+            for color in ("black", "white"):
+                (DST_DIR / piece / color).mkdir(parents=True, exist_ok=True)
+
+    tasks = [
+        (chunk_id, start, min(CHUNK, args.boards - start), themes, not args.no_tiles, args.seed)
+        for chunk_id, start in enumerate(range(0, args.boards, CHUNK))
+    ]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        rendered = sum(pool.map(render_chunk, tasks))
+
+    print("---- SUMMARY ----")
+    print(f"Themes : {len(themes)}")
+    print(f"Boards rendered : {rendered}")
+    if not args.no_tiles:
+        print(f"Tiles written : {rendered * 64}")
+    print(f"Destination : {DST_DIR}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render synthetic labeled boards and tiles from the piece sprites.")
+    parser.add_argument("--boards", type=int, default=1000)
+    parser.add_argument("--styles", nargs="+", help="only these styles (default: all)")
+    parser.add_argument("--no-tiles", action="store_true", help="only write full boards and their FEN labels")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    sys.exit(main(parser.parse_args()))
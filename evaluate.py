@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+evaluate.py
+
+Evaluate a model on every dataset/Pieces/{style}/{theme} tile set (plus the
+empty squares of the matching dataset/Board screenshot) and on labeled full
+boards. Images are decoded in worker processes and classified in large
+batches, then reported as:
+  - per-class and per-theme confusion matrices over the 13 square classes
+  - a THRESHOLD calibration curve (empty cutoff vs. square accuracy) and a
+    reliability curve of the piece confidence
+  - board-level FEN accuracy on tests/ and, optionally, synthetic boards
+
+Usage:
+  python3 evaluate.py
+  python3 evaluate.py --backend tflite --quantization int8 -o eval.json
+  python3 evaluate.py --synthetic 500 --styles Neo
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+import main
+import board
+
+BOARD_DIR = "dataset/Board"
+PIECES_DIR = "dataset/Pieces"
+SYNTHETIC_DIR = "dataset/synthetic/boards"
+EMPTY_ROWS = range(2, 6)       # ranks 6-3 are empty on every board screenshot
+BATCH_SIZE = 512
+THRESHOLDS = np.round(np.arange(0.0, 1.0, 0.05), 2).tolist() + [0.97, 0.99]
+CONFIDENCE_BINS = 10
+CLASSES = board.SYMBOLS        # "." (empty) then the 12 pieces
+
+# (piece_idx, color_idx) -> class index, like main.fen_table
+class_table = np.array([[CLASSES.index(symbol) for symbol in row] for row in main.fen_table], dtype = np.uint8)
+
+def find_themes(styles = None):
+    themes = []
+    for path in sorted(glob.glob(os.path.join(BOARD_DIR, "*", "*.png"))):
+        style, theme = os.path.basename(os.path.dirname(path)), os.path.splitext(os.path.basename(path))[0]
+        if styles and style not in styles:
+            continue
+        if os.path.isdir(os.path.join(PIECES_DIR, style, theme)):
+            themes.append((style, theme))
+    return themes
+
+def load_theme(style, theme, size = main.IMAGE_SIZE):
+    # worker: (uint8 tiles, class codes) for one theme's piece images and empty squares
+    tiles, codes = [], []
+    for (piece, color), symbol in main.fen_map.items():
+        for path in sorted(glob.glob(os.path.join(PIECES_DIR, style, theme, piece, color, "*.png"))):
+            tiles.append(np.asarray(Image.open(path).convert("RGB").resize(size)))
+            codes.append(CLASSES.index(symbol))
+
+    grid = main.tile_grid(np.asarray(main.open_board(os.path.join(BOARD_DIR, style, f"{theme}.png"), size)))
+    for row in EMPTY_ROWS:
+        tiles.extend(grid[row])
+        codes.extend([CLASSES.index(".")] * 8)
+    return f"{style}/{theme}", np.stack(tiles), np.array(codes, dtype = np.uint8)
+
+def load_board(path):
+    # worker: decoded board pixels, rebuilt into an image in the main process
+    return np.asarray(main.open_board(path))
+
+def list_boards(synthetic = 0):
+    from examples import examples
+
+    paths = [path for path, _, _ in examples]
+    flips = [is_flipped for _, is_flipped, _ in examples]
+    placements = [placement for _, _, placement in examples]
+    sources = ["tests"] * len(examples)
+    labels = sorted(glob.glob(os.path.join(SYNTHETIC_DIR, "labels_*.jsonl")))
+    for labels_file in labels:
+        with open(labels_file) as file:
+            for line in file:
+                if len(sources) - len(examples) >= synthetic:
+                    break
+                entry = json.loads(line)
+                paths.append(os.path.join(SYNTHETIC_DIR, entry["image"]))
+                flips.append(False)
+                placements.append(entry["fen"])
+                sources.append("synthetic")
+    return paths, flips, placements, sources
+
+def confusion(expected, predicted, n = len(CLASSES)):
+    return np.bincount(expected.astype(np.int64) * n + predicted, minlength = n * n).reshape(n, n)
+
+def class_report(matrix):
+    report = {}
+    for i, symbol in enumerate(CLASSES):
+        support, predicted = matrix[i].sum(), matrix[:, i].sum()
+        report[symbol] = {
+            "support": int(support),
+            "precision": float(matrix[i, i] / predicted) if predicted else None,
+            "recall": float(matrix[i, i] / support) if support else None,
+        }
+    return report
+
+def classify(tiles, batch_size):
+    # raw model outputs -> (piece symbol code, piece confidence) per tile, before THRESHOLD
+    model = main.get_model()
+    piece_preds, color_preds = [], []
+    for start in range(0, len(tiles), batch_size):
+        chunk = tiles[start:start + batch_size].astype(np.float32) / np.float32(255.0)
+        piece_pred, color_pred = model.predict(chunk, batch_size)
+        piece_preds.append(piece_pred)
+        color_preds.append(color_pred)
+    piece_pred, color_pred = np.concatenate(piece_preds), np.concatenate(color_preds)
+    return class_table[piece_pred.argmax(axis = 1), color_pred.argmax(axis = 1)], piece_pred.max(axis = 1)
+
+def calibration(expected, piece_codes, confidence):
+    # square accuracy for every candidate THRESHOLD, and how the piece confidence tracks accuracy
+    is_empty = expected == 0
+    curve = []
+    for threshold in THRESHOLDS:
+        predicted = np.where(confidence < threshold, 0, piece_codes)
+        curve.append({
+            "threshold": threshold,
+            "accuracy": float(np.mean(predicted == expected)),
+            "empty_recall": float(np.mean(predicted[is_empty] == 0)) if is_empty.any() else None,
+            "pieces_dropped": float(np.mean(predicted[~is_empty] == 0)) if (~is_empty).any() else None,
+        })
+
+    bins = np.minimum((confidence * CONFIDENCE_BINS).astype(int), CONFIDENCE_BINS - 1)
+    reliability = []
+    for b in range(CONFIDENCE_BINS):
+        in_bin = (bins == b) & ~is_empty
+        if in_bin.any():
+            reliability.append({
+                "confidence": [b / CONFIDENCE_BINS, (b + 1) / CONFIDENCE_BINS],
+                "tiles": int(in_bin.sum()),
+                "mean_confidence": float(confidence[in_bin].mean()),
+                "accuracy": float(np.mean(piece_codes[in_bin] == expected[in_bin])),
+            })
+    best = max(curve, key = lambda point: point["accuracy"])
+    return {"curve": curve, "reliability": reliability, "best_threshold": best["threshold"]}
+
+def evaluate_tiles(themes, pool, batch_size):
+    names, tiles, expected = [], [], []
+    for name, theme_tiles, codes in pool.map(load_theme, *zip(*themes)):
+        names.extend([name] * len(codes))
+        tiles.append(theme_tiles)
+        expected.append(codes)
+    tiles, expected, names = np.concatenate(tiles), np.concatenate(expected), np.array(names)
+
+    piece_codes, confidence = classify(tiles, batch_size)
+    predicted = np.where(confidence < main.THRESHOLD, 0, piece_codes)
+    matrix = confusion(expected, predicted)
+    per_theme = {}
+    for name in dict.fromkeys(names):
+        in_theme = names == name
+        theme_matrix = confusion(expected[in_theme], predicted[in_theme])
+        per_theme[name] = {
+            "tiles": int(in_theme.sum()),
+            "accuracy": float(np.trace(theme_matrix) / theme_matrix.sum()),
+            "confusion": theme_matrix.tolist(),
+        }
+    return {
+        "tiles": len(expected),
+        "threshold": main.THRESHOLD,
+        "accuracy": float(np.trace(matrix) / matrix.sum()),
+        "confusion": matrix.tolist(),
+        "classes": class_report(matrix),
+        "themes": per_theme,
+        "calibration": calibration(expected, piece_codes, confidence),
+    }
+
+def evaluate_boards(pool, synthetic, batch_size):
+    paths, flips, placements, sources = list_boards(synthetic)
+    images = (Image.fromarray(pixels) for pixels in pool.map(load_board, paths, chunksize = 16))
+    predicted, valid = main.generate_board_batch(images, flips, batch_size = batch_size)
+    expected = board.from_fens(placements)
+    sources = np.array(sources)
+
+    results = {}
+    for source in dict.fromkeys(sources):
+        rows = (sources == source) & valid
+        squares = predicted[rows] == expected[rows]
+        results[source] = {
+            "boards": int((sources == source).sum()),
+            "fen_accuracy": float(squares.all(axis = 1).mean()) if rows.any() else None,
+            "square_accuracy": float(squares.mean()) if rows.any() else None,
+            "plausible": float(board.check(predicted[rows]).mean()) if rows.any() else None,
+        }
+    return results
+
+def print_report(results):
+    print("---- EVALUATION ----")
+    print(f"Model : {results['meta']['backend']} {results['meta']['model_path']}")
+    tiles = results.get("tiles")
+    if tiles:
+        print(f"Tiles : {tiles['tiles']}, accuracy {tiles['accuracy']:.4f} at THRESHOLD {tiles['threshold']}")
+        print(f"Best THRESHOLD : {tiles['calibration']['best_threshold']}")
+        print()
+        print(f"{'class':<8}{'support':>9}{'precision':>11}{'recall':>9}")
+        for symbol, stats in tiles["classes"].items():
+            fmt = lambda value: f"{value:.3f}" if value is not None else "-"
+            print(f"{symbol:<8}{stats['support']:>9}{fmt(stats['precision']):>11}{fmt(stats['recall']):>9}")
+        print()
+        print("true\\pred " + "".join(f"{symbol:>5}" for symbol in CLASSES))
+        for symbol, row in zip(CLASSES, tiles["confusion"]):
+            print(f"{symbol:<10}" + "".join(f"{n:>5}" for n in row))
+        print()
+        print(f"{'theme':<24}{'tiles':>7}{'accuracy':>10}")
+        for name, stats in tiles["themes"].items():
+            print(f"{name:<24}{stats['tiles']:>7}{stats['accuracy']:>10.4f}")
+        print()
+    for source, stats in results["boards"].items():
+        if stats["fen_accuracy"] is not None:
+            print(f"Boards ({source}) : {stats['boards']}, FEN accuracy {stats['fen_accuracy']:.4f}, "
+                  f"square accuracy {stats['square_accuracy']:.4f}, plausible {stats['plausible']:.4f}")
+    print(f"Elapsed : {results['meta']['seconds']:.1f}s")
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Evaluate a model on the piece dataset and labeled boards.")
+    parser.add_argument("--backend", default = main.BACKEND, help = "keras | tflite | onnx | board")
+    parser.add_argument("--quantization", default = "float32")
+    parser.add_argument("--model-path", help = "model file (default: the backend's trained_models artifact)")
+    parser.add_argument("--styles", nargs = "+", help = "only these styles (default: all)")
+    parser.add_argument("--synthetic", type = int, default = 0, help = f"also score this many boards from {SYNTHETIC_DIR}")
+    parser.add_argument("--batch-size", type = int, default = BATCH_SIZE)
+    parser.add_argument("--workers", type = int, default = None, help = "decoding processes (default: CPU count)")
+    parser.add_argument("-o", "--output", help = "write the full results as JSON to this file")
+    return parser.parse_args(argv)
+
+def run(args):
+    # score the model itself: every tile goes to the model, nothing is cached
+    main.set_backend(args.backend, args.quantization, args.model_path)
+    main.set_tile_cache(0)
+    main.set_empty_filter(None)
+
+    themes = find_themes(args.styles)
+    if not themes:
+        print(f"ERROR: no board/piece themes found under {BOARD_DIR} and {PIECES_DIR}")
+        return 1
+
+    start = time.perf_counter()
+    results = {"meta": {"backend": main.BACKEND, "model_path": main.MODEL_PATH}}
+    # spawned, not forked: the parent holds TensorFlow's threads once the model is loaded
+    with ProcessPoolExecutor(max_workers = args.workers, mp_context = multiprocessing.get_context("spawn")) as pool:
+        if not main.whole_board_model():
+            # the whole-board model has no per-tile output, it is only scored on boards
+            results["tiles"] = evaluate_tiles(themes, pool, args.batch_size)
+        results["boards"] = evaluate_boards(pool, args.synthetic, args.batch_size)
+    results["meta"]["seconds"] = time.perf_counter() - start
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent = 2)
+        print(f"✅ Results saved at {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
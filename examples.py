@@ -0,0 +1,19 @@
+"""
+The labeled example boards in tests/, used as ground truth by tests.py and
+by the measuring tools (prefilter.py, evaluate.py, cascade.py).
+"""
+
+EXAMPLES_DIR = "tests"
+
+placements = [
+    "4krnr/p5Q1/1pp1p3/3p1pP1/3P4/3N4/PPP1N1PP/R4RK1",
+    "7k/1bp3pp/3p4/1P1P1p2/3q4/1R4P1/2QBr2P/3R3K",
+    "rn1qkbnr/1pp2ppp/p2p4/4N3/2B1P1b1/2N5/PPPP1PPP/R1BQK2R",
+    "7k/2p3pp/3p4/1P1b1p2/3q4/1R4P1/2QBr2P/3R3K",
+    "4rrk1/ppp1bppp/3q1n2/4n3/2B1P1b1/1PP1QN2/PB1N1PPP/R4RK1",
+    "r4r1k/5ppp/p2p4/1p3N2/3QP1n1/P2P4/1P2KPq1/R3R3"
+]
+FLIPPED = (3, 4)    # boards seen from black's side
+
+# (image, is_flipped, expected placement) for every example board
+examples = [(f"{EXAMPLES_DIR}/Example {i + 1}.png", i in FLIPPED, fen) for i, fen in enumerate(placements)]
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+export_model.py
+
+Export the trained Keras model to TFLite and/or ONNX, with float32, float16
+and int8 post-training quantization (int8 is calibrated on the flattened
+dataset), then compare every artifact against the .h5 baseline.
+
+Usage:
+  python3 export_model.py
+  python3 export_model.py --formats tflite --quantizations float16 int8
+  python3 export_model.py --report-only
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+import main
+import backends
+
+DATASET_DIR = "dataset/flattened_dataset"
+CALIBRATION_SAMPLES = 200
+LATENCY_RUNS = 20
+SEED = 42
+
+def list_dataset(dataset_dir = DATASET_DIR):
+    image_paths, piece_labels, color_labels = [], [], []
+    for piece_idx, piece in enumerate(main.pieces):
+        for color_idx, color in enumerate(main.colors):
+            folder = Path(dataset_dir) / piece / color
+            if not folder.exists():
+                continue
+            for img_file in sorted(folder.glob("*.png")):
+                image_paths.append(str(img_file))
+                piece_labels.append(piece_idx)
+                color_labels.append(color_idx)
+    return image_paths, np.array(piece_labels), np.array(color_labels)
+
+def load_samples(image_paths):
+    return np.stack([main.load_image(path) for path in image_paths])
+
+def representative_dataset(samples, count = CALIBRATION_SAMPLES):
+    rng = np.random.default_rng(SEED)
+    picks = rng.permutation(len(samples))[:count]
+    return [samples[i:i + 1] for i in picks]
+
+def _concrete_function(model):
+    import tensorflow as tf
+
+    @tf.function(input_signature = [tf.TensorSpec([None] + list(main.IMAGE_SIZE) + [3], tf.float32, name = "tiles")])
+    def serve(tiles):
+        piece_pred, color_pred = model(tiles, training = False)
+        return {"piece": piece_pred, "color": color_pred}
+
+    return serve
+
+def export_tflite(model, quantization, calibration, path):
+    import tensorflow as tf
+
+    serve = _concrete_function(model)
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([serve.get_concrete_function()], serve)
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        # float in/out, int8 weights and activations
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([sample] for sample in calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    with open(path, "wb") as file:
+        file.write(converter.convert())
+
+def export_onnx(model, quantization, calibration, path):
+    try:
+        import tf2onnx
+        import onnx
+    except ImportError:
+        raise ImportError("ONNX export needs tf2onnx and onnx: pip3 install tf2onnx onnx")
+
+    serve = _concrete_function(model)
+    onnx_model, _ = tf2onnx.convert.from_function(serve, input_signature = serve.input_signature, opset = 13)
+
+    if quantization == "float16":
+        from onnxconverter_common import float16
+        onnx_model = float16.convert_float_to_float16(onnx_model, keep_io_types = True)
+    elif quantization == "int8":
+        from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+
+        class Reader(CalibrationDataReader):
+            def __init__(self):
+                self.samples = iter(calibration)
+
+            def get_next(self):
+                sample = next(self.samples, None)
+                return None if sample is None else {onnx_model.graph.input[0].name: sample}
+
+        float_path = f"{path}.float32.tmp"
+        onnx.save(onnx_model, float_path)
+        try:
+            quantize_static(float_path, path, Reader(), weight_type = QuantType.QInt8, activation_type = QuantType.QInt8)
+        finally:
+            os.remove(float_path)
+        return
+
+    onnx.save(onnx_model, path)
+
+EXPORTERS = {
+    "tflite": export_tflite,
+    "onnx": export_onnx,
+}
+
+def measure(backend, samples, piece_labels, color_labels, reference = None):
+    piece_pred, color_pred = backend.predict(samples, main.BATCH_SIZE)
+    symbols = main.decode_predictions(piece_pred, color_pred)
+
+    board = samples[np.arange(64) % len(samples)]
+    backend.predict(board)
+    timings = []
+    for _ in range(LATENCY_RUNS):
+        start = time.perf_counter()
+        backend.predict(board)
+        timings.append(time.perf_counter() - start)
+
+    result = {
+        "piece_accuracy": float(np.mean(np.argmax(piece_pred, axis = 1) == piece_labels)),
+        "color_accuracy": float(np.mean(np.argmax(color_pred, axis = 1) == color_labels)),
+        "board_latency_ms": float(np.median(timings) * 1000),
+    }
+    if reference is not None:
+        result["agreement"] = float(np.mean(np.array(symbols) == np.array(reference)))
+    return result, symbols
+
+def report(artifacts, samples, piece_labels, color_labels):
+    baseline, reference = measure(backends.load_backend("keras"), samples, piece_labels, color_labels)
+    rows = {"keras/float32": baseline}
+    for name, quantization, path in artifacts:
+        if not os.path.exists(path):
+            continue
+        result, _ = measure(backends.load_backend(name, path), samples, piece_labels, color_labels, reference)
+        result["size_mb"] = os.path.getsize(path) / 2 ** 20
+        result["piece_accuracy_delta"] = result["piece_accuracy"] - baseline["piece_accuracy"]
+        result["color_accuracy_delta"] = result["color_accuracy"] - baseline["color_accuracy"]
+        result["speedup"] = baseline["board_latency_ms"] / result["board_latency_ms"]
+        rows[f"{name}/{quantization}"] = result
+    baseline["size_mb"] = os.path.getsize(backends.model_path("keras")) / 2 ** 20
+
+    print("---- REPORT ----")
+    print(f"{'artifact':<16}{'size MB':>9}{'piece acc':>11}{'color acc':>11}{'agree':>8}{'ms/board':>10}{'speedup':>9}")
+    for key, row in rows.items():
+        print(f"{key:<16}{row['size_mb']:>9.2f}{row['piece_accuracy']:>11.4f}{row['color_accuracy']:>11.4f}"
+              f"{row.get('agreement', 1.0):>8.4f}{row['board_latency_ms']:>10.2f}{row.get('speedup', 1.0):>9.2f}")
+    return rows
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Export the tile model to TFLite/ONNX and report accuracy and latency.")
+    parser.add_argument("--formats", nargs = "+", choices = list(EXPORTERS), default = list(EXPORTERS))
+    parser.add_argument("--quantizations", nargs = "+", choices = backends.QUANTIZATIONS, default = backends.QUANTIZATIONS)
+    parser.add_argument("--dataset", default = DATASET_DIR, help = "flattened dataset used for calibration and the report")
+    parser.add_argument("--report-only", action = "store_true", help = "only compare already exported artifacts")
+    return parser.parse_args(argv)
+
+def run(args):
+    image_paths, piece_labels, color_labels = list_dataset(args.dataset)
+    if not image_paths:
+        print(f"ERROR: no images found under {args.dataset}")
+        return 1
+    samples = load_samples(image_paths)
+    print(f"✅ Found {len(image_paths)} images")
+
+    artifacts = [
+        (name, quantization, backends.model_path(name, quantization))
+        for name in args.formats for quantization in args.quantizations
+    ]
+    if not args.report_only:
+        model = backends.load_keras_model(backends.model_path("keras"))
+        calibration = representative_dataset(samples)
+        for name, quantization, path in artifacts:
+            EXPORTERS[name](model, quantization, calibration, path)
+            print(f"✅ Exported {path}")
+
+    rows = report(artifacts, samples, piece_labels, color_labels)
+    report_path = os.path.join(backends.MODEL_DIR, f"{backends.MODEL_NAME}_report.json")
+    with open(report_path, "w") as file:
+        json.dump(rows, file, indent = 2)
+    print(f"✅ Report saved at {report_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
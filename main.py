@@ -1,26 +1,77 @@
+import sys
+import threading
 import numpy as np
+from itertools import repeat
 from PIL import Image
-import tensorflow.python.keras as tf_keras
-from tensorflow.python.keras.models import load_model
 
-from tensorflow.python.keras.engine import data_adapter
+import board
+import backends
+import metrics
+from tile_cache import TileCache
+from prefilter import EmptyFilter
 
-from keras import __version__
-tf_keras.__version__ = __version__
+BACKEND = "keras"         # keras | tflite | onnx | board, see backends.py
+MODEL_PATH = backends.model_path(BACKEND)
 
-from trained_models.model_version import VERSION
+# TensorFlow is only imported when the model is first needed, so the
+# FEN helpers below stay cheap to import
+_model = None
+_model_lock = threading.Lock()
+_backend_options = {}
 
-def _is_distributed_dataset(ds):
-    return isinstance(ds, data_adapter.input_lib.DistributedDatasetSpec)
+def set_backend(name = "keras", quantization = "float32", path = None, **options):
+    # e.g. set_backend("tflite", "int8"), set_backend("onnx", num_threads = 2)
+    # or set_backend("board") for the whole-board model
+    global BACKEND, MODEL_PATH, _model, _backend_options
+    with _model_lock:
+        BACKEND = name
+        MODEL_PATH = path or backends.model_path(name, quantization)
+        _backend_options = options
+        _model = None
+    if tile_cache is not None:
+        tile_cache.clear()
 
-data_adapter._is_distributed_dataset = _is_distributed_dataset
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                with metrics.timer("model_load"):
+                    _model = backends.load_backend(BACKEND, MODEL_PATH, **_backend_options)
+                # stderr, so tools that write results to stdout (scan.py) keep it clean
+                print("✅ Model loaded successfully!", file = sys.stderr)
+    return _model
 
-MODEL_PATH = f"trained_models/chess_piece_color_model{VERSION}.h5"
-predictionModel = load_model(MODEL_PATH)
-print("✅ Model loaded successfully!")
+def whole_board_model():
+    return getattr(get_model(), "whole_board", False)
+
+def require_tile_model(caller):
+    # the backend is process-wide: after set_backend("board") there is no per-tile model
+    # for callers that classify single tiles (server.py, StreamScanner)
+    if whole_board_model():
+        raise RuntimeError(f"{caller} classifies single tiles, which the whole-board backend {BACKEND!r} cannot do; "
+                           "use a tile backend (keras, tflite or onnx)")
+
+def warmup():
+    # load the model(s) and run one dummy board through them, past the prefilter and cache
+    if whole_board_model():
+        classify_boards(np.zeros((1,) + BOARD_SIZE + (3,), dtype = np.float32))
+    else:
+        classify_tiles(np.zeros((64,) + IMAGE_SIZE + (3,), dtype = np.float32))
+
+def __getattr__(name):
+    # `main.predictionModel` used to be created at import time
+    if name == "predictionModel":
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 IMAGE_SIZE = (128, 128)   # must match training
+BOARD_SIZE = (256, 256)   # whole-board model input, must match BoardCNN.py
 THRESHOLD = 0.9          # min confidence to consider non-empty
+BATCH_SIZE = 256         # tiles per model call in batch mode
+MAX_BOARDS = 16          # boards held in memory at once in batch mode
+TILE_CACHE_SIZE = 4096   # cached tile classifications, 0 disables the cache
+EMPTY_FILTER = True      # skip the model for flat, obviously empty tiles
 pieces = ["pawn", "rook", "knight", "bishop", "queen", "king"]
 colors = ["black", "white"]
 
@@ -44,19 +95,19 @@ def load_image(path):
     img = Image.open(path).convert("RGB").resize(IMAGE_SIZE)
     return np.array(img, dtype=np.float32) / 255.0
 
-def predict_image(img_path, model):
+def predict_image(img_path, model = None):
     # TODO: pre-process the image
+    if model is None:
+        model = get_model()
     img = load_image(img_path)
     arr = np.expand_dims(img, axis=0)
 
-    piece_pred, color_pred = model.predict(arr, verbose = 0)
+    piece_pred, color_pred = model.predict(arr)
     piece_idx = np.argmax(piece_pred[0])
     color_idx = np.argmax(color_pred[0])
 
-    piece_conf = piece_pred[0][piece_idx]
-    color_conf = color_pred[0][color_idx]
-
-    print(piece_conf, color_conf)
+    metrics.observe("confidence", piece_pred[0][piece_idx], "piece")
+    metrics.observe("confidence", color_pred[0][color_idx], "color")
 
     piece = pieces[piece_idx]
     color = colors[color_idx]
@@ -71,61 +122,284 @@ def preprocess(img, size = IMAGE_SIZE):
     arr = np.array(img, dtype = np.float32) / 255.0
     return np.expand_dims(arr, axis=0)
 
-def predict_square(img):
-    arr = preprocess(img)
-    piece_pred, color_pred = predictionModel.predict(arr, verbose = 0)
+# (piece_idx, color_idx) -> FEN symbol, for vectorized decoding
+fen_table = np.array([[fen_map[(piece, color)] for color in colors] for piece in pieces])
 
-    piece_idx = np.argmax(piece_pred[0])
-    color_idx = np.argmax(color_pred[0])
-    piece_conf = piece_pred[0][piece_idx]
-    color_conf = color_pred[0][color_idx]
+def decode_predictions(piece_pred, color_pred):
+    piece_idx = np.argmax(piece_pred, axis=1)
+    color_idx = np.argmax(color_pred, axis=1)
+    piece_conf = np.take_along_axis(piece_pred, piece_idx[:, None], axis=1)[:, 0]
+    if metrics.enabled:
+        metrics.observe("confidence", piece_conf, "piece")
+        metrics.observe("confidence", color_pred.max(axis=1), "color")
 
+    symbols = fen_table[piece_idx, color_idx]
     # If low confidence -> empty square
-    if piece_conf < THRESHOLD:
-        return "."
+    symbols[piece_conf < THRESHOLD] = "."
+    return symbols.tolist()
 
-    piece = pieces[piece_idx]
-    color = colors[color_idx]
-    
-    #if color_conf < THRESHOLD:
-    #    color = colors[(color_idx + 1) & 1]
-    
-    return fen_map[(piece, color)]
+# cached symbols depend on the backend, cascade and THRESHOLD, set_backend() and set_cascade() clear them
+tile_cache = TileCache(TILE_CACHE_SIZE) if TILE_CACHE_SIZE else None
 
-def generate_board_matrix(board_img):
+def set_tile_cache(max_entries = TILE_CACHE_SIZE):
+    global tile_cache
+    tile_cache = TileCache(max_entries) if max_entries else None
+
+# a cascade.Cascade sends every tile to a small model first, None uses the full model only
+cascade = None
+
+def set_cascade(active):
+    # e.g. set_cascade(Cascade(piece_threshold = 0.99)), or None to turn it off
+    global cascade
+    cascade = active
+    if tile_cache is not None:
+        tile_cache.clear()
+
+def normalize(tiles):
+    # uint8 tiles -> the float32 [0, 1] model input, float tiles are passed through
+    if tiles.dtype != np.uint8:
+        return tiles
+    out = np.empty(tiles.shape, dtype = np.float32)
+    np.divide(tiles, np.float32(255.0), out = out)
+    return out
+
+def classify_tiles(batch, batch_size = None):
+    # one forward pass for a whole (N, h, w, 3) stack of tiles, uint8 or float32
+    batch = normalize(batch)
+    model = get_model()
+    active = cascade
+    with metrics.timer("inference"):
+        if active is None:
+            piece_pred, color_pred = model.predict(batch, batch_size)
+        else:
+            piece_pred, color_pred = active.predict(batch, model, batch_size)
+    metrics.count("tiles", "classified", len(batch))
+    return decode_predictions(piece_pred, color_pred)
+
+def _lookup_or_classify(batch, batch_size = None):
+    cache = tile_cache
+    if cache is None:
+        return classify_tiles(batch, batch_size)
+
+    keys = [cache.key(tile) for tile in batch]
+    symbols = cache.get_many(keys)
+
+    # classify each distinct uncached tile once
+    missing = {}
+    for i, symbol in enumerate(symbols):
+        if symbol is None:
+            missing.setdefault(keys[i], i)
+    if missing:
+        found = dict(zip(missing, classify_tiles(batch[list(missing.values())], batch_size)))
+        for key, symbol in found.items():
+            cache.put(key, symbol)
+        symbols = [found[key] if symbol is None else symbol for key, symbol in zip(keys, symbols)]
+    return symbols
+
+empty_filter = EmptyFilter() if EMPTY_FILTER else None
+
+def set_empty_filter(active):
+    # an EmptyFilter instance, or None to send every tile to the model
+    global empty_filter
+    empty_filter = active
+
+def predict_squares(batch, batch_size = None):
+    with metrics.timer("predict_squares"):
+        active = empty_filter
+        if active is None:
+            symbols = _lookup_or_classify(batch, batch_size)
+        else:
+            symbols = ["."] * len(batch)
+            with metrics.timer("prefilter"):
+                occupied = np.flatnonzero(~active.mask(batch))
+            metrics.count("tiles", "prefiltered", len(batch) - len(occupied))
+            if len(occupied):
+                for i, symbol in zip(occupied, _lookup_or_classify(batch[occupied], batch_size)):
+                    symbols[i] = symbol
+
+    if metrics.enabled:
+        empty = symbols.count(".")
+        metrics.count("tiles", "empty", empty)
+        metrics.count("tiles", "occupied", len(symbols) - empty)
+    return symbols
+
+# whole-board model class index -> FEN symbol, the board.py square codes like BoardCNN.SYMBOLS
+board_symbols = np.array(list(board.SYMBOLS))
+
+def classify_boards(boards, batch_size = None):
+    # (N, H, W, 3) boards -> N * 64 symbols in one pass of the whole-board model,
+    # empty is its own class so THRESHOLD does not apply
+    model = get_model()
+    with metrics.timer("inference"):
+        square_pred = model.predict_boards(boards, batch_size)
+    square_pred = square_pred.reshape(-1, len(board_symbols))
+    metrics.count("tiles", "classified", len(square_pred))
+    if metrics.enabled:
+        metrics.observe("confidence", square_pred.max(axis = 1), "square")
+    return board_symbols[np.argmax(square_pred, axis = 1)].tolist()
+
+def predict_square(img):
+    return predict_squares(preprocess(img))[0]
+
+def tile_grid(arr):
+    # (8h, 8w, 3) board array -> (8, 8, h, w, 3) view, no pixels are copied
+    h, w = arr.shape[0] // 8, arr.shape[1] // 8
+    return arr[:h * 8, :w * 8].reshape(8, h, 8, w, 3).swapaxes(1, 2)
+
+def board_pixels(board_img, size = IMAGE_SIZE):
+    # (64, h, w, 3) uint8 tiles, None for non-square boards; predict_squares takes
+    # them as they are and only normalizes the tiles that reach the model
     w, h = board_img.size
     if w != h:
         return None
     sq_w, sq_h = w // 8, h // 8
 
+    board_img = board_img.convert("RGB")
+    if (sq_w, sq_h) != size:
+        # one resample of the whole 8x8 grid instead of one per square
+        board_img = board_img.resize((size[0] * 8, size[1] * 8), box = (0, 0, sq_w * 8, sq_h * 8))
+
+    grid = tile_grid(np.asarray(board_img))
+    return grid.reshape((64,) + grid.shape[2:])
+
+def board_tiles(board_img, size = IMAGE_SIZE):
+    # (64, h, w, 3) float32 model input
+    tiles = board_pixels(board_img, size)
+    return None if tiles is None else normalize(tiles)
+
+def open_board(source, size = IMAGE_SIZE):
+    """
+    Read a board image straight to the 8 x `size` grid the model needs, with a
+    single resample. JPEGs are decoded at a reduced scale (PIL draft mode)
+    when the file is much larger than the grid.
+    """
+    img = Image.open(source)
+    grid_size = (size[0] * 8, size[1] * 8)
+    if img.format == "JPEG":
+        img.draft("RGB", grid_size)
+    img = img.convert("RGB")
+    if img.size != grid_size:
+        img = img.resize(grid_size)
+    return img
+
+def load_board_tensor(source, size = IMAGE_SIZE):
+    # (64, h, w, 3) model input for an image file, no per-square resampling
+    return board_tiles(open_board(source, size), size)
+
+def board_array(board_img, size = BOARD_SIZE):
+    # (H, W, 3) float32 input of the whole-board model, None for non-square boards
+    w, h = board_img.size
+    if w != h:
+        return None
+    board_img = board_img.convert("RGB")
+    if board_img.size != size:
+        board_img = board_img.resize(size)
+    arr = np.empty(size[::-1] + (3,), dtype = np.float32)
+    np.divide(np.asarray(board_img), np.float32(255.0), out = arr)
+    return arr
+
+def to_matrix(predictions):
+    return [predictions[row * 8:(row + 1) * 8] for row in range(8)]
+
+def flip_matrix(board_matrix):
+    return [row[::-1] for row in board_matrix[::-1]]
+
+def generate_board_matrix(board_img):
+    with metrics.timer("generate_board_matrix"):
+        if whole_board_model():
+            board = board_array(board_img)
+            if board is None:
+                return None
+            metrics.count("boards")
+            return to_matrix(classify_boards(board[None]))
+
+        with metrics.timer("tiling"):
+            tiles = board_pixels(board_img)
+        if tiles is None:
+            return None
+        metrics.count("boards")
+        return to_matrix(predict_squares(tiles))
+
+def _flush_boards(pending, inputs, batch_size, whole_board = False):
+    # classify one chunk of boards -> (len(inputs), 64) codes, flipped where requested
+    if not inputs:
+        return np.empty((0, 64), dtype = np.uint8)
+    if whole_board:
+        predictions = classify_boards(np.stack(inputs), batch_size and max(1, batch_size // 64))
+    else:
+        predictions = predict_squares(np.concatenate(inputs), batch_size)
+    metrics.count("boards", value = len(inputs))
+
+    codes = board.encode(predictions)
+    flips = np.array([is_flipped for is_valid, is_flipped in pending if is_valid], dtype = bool)
+    codes[flips] = board.flip(codes[flips])
+    return codes
+
+def _iter_board_chunks(images, flipped, batch_size, max_boards):
+    # yields (per-image valid flags, codes of the valid boards) for every `max_boards` images
+    flips = repeat(flipped) if isinstance(flipped, bool) else flipped
+    whole_board = whole_board_model()
+    prepare = board_array if whole_board else board_pixels
+    pending, inputs = [], []
+    for img, is_flipped in zip(images, flips):
+        with metrics.timer("tiling"):
+            tensor = prepare(img)
+        pending.append((tensor is not None, is_flipped))
+        if tensor is not None:
+            inputs.append(tensor)
+        if len(pending) >= max_boards:
+            yield [is_valid for is_valid, _ in pending], _flush_boards(pending, inputs, batch_size, whole_board)
+            pending, inputs = [], []
+    if pending:
+        yield [is_valid for is_valid, _ in pending], _flush_boards(pending, inputs, batch_size, whole_board)
+
+def iter_fen_batch(images, flipped = False, batch_size = BATCH_SIZE, max_boards = MAX_BOARDS):
+    """
+    Lazily yield one FEN placement (or None for non-square boards) per image.
+    At most `max_boards` boards are decoded and held in memory at a time, their
+    tiles are classified together in model calls of `batch_size` tiles.
+    `flipped` is either one flag for every board or an iterable of per-board flags.
+    """
+    for valid, codes in _iter_board_chunks(images, flipped, batch_size, max_boards):
+        fens = iter(board.to_fens(codes))
+        for is_valid in valid:
+            yield next(fens) if is_valid else None
+
+def generate_fen_batch(images, flipped = False, batch_size = BATCH_SIZE, max_boards = MAX_BOARDS):
+    return list(iter_fen_batch(images, flipped, batch_size, max_boards))
+
+def generate_board_batch(images, flipped = False, batch_size = BATCH_SIZE, max_boards = MAX_BOARDS):
+    """
+    Like `generate_fen_batch`, but returns the positions in the compact form of
+    board.py: a (N, 64) uint8 array (64 bytes per board) and a (N,) bool array
+    that is False for non-square images, whose rows are left empty.
+    """
+    boards, valid = [], []
+    for chunk_valid, codes in _iter_board_chunks(images, flipped, batch_size, max_boards):
+        rows = np.zeros((len(chunk_valid), 64), dtype = np.uint8)
+        rows[np.array(chunk_valid, dtype = bool)] = codes
+        boards.append(rows)
+        valid.extend(chunk_valid)
+    if not boards:
+        return np.empty((0, 64), dtype = np.uint8), np.empty(0, dtype = bool)
+    return np.concatenate(boards), np.array(valid, dtype = bool)
+
+def fen_to_matrix(placement):
     board_matrix = []
-    for row in range(8):
-        row_pieces = []
-        for col in range(8):
-            square = board_img.crop((col * sq_w, row * sq_h, (col + 1) * sq_w, (row + 1) * sq_h))
-            prediction = predict_square(square)
-            row_pieces.append(prediction)
-        board_matrix.append(row_pieces)
-    
+    for fen_row in placement.split("/"):
+        row = []
+        for cell in fen_row:
+            row.extend("." * int(cell) if cell.isdigit() else cell)
+        board_matrix.append(row)
     return board_matrix
 
 def matrix_to_fen(board_matrix):
-    fen_rows = []
-    for row in board_matrix:
-        fen_row = ""
-        empty_count = 0
-        for cell in row:
-            if cell == ".":
-                empty_count += 1
-            else:
-                if empty_count > 0:
-                    fen_row += str(empty_count)
-                    empty_count = 0
-                fen_row += cell
-        if empty_count > 0:
-            fen_row += str(empty_count)
-        fen_rows.append(fen_row)
-    return "/".join(fen_rows)
+    # runs of empty squares never cross a "/", so replacing the longest runs
+    # first turns them into digits; board.to_fens does the same for batches
+    placement = "/".join("".join(row) for row in board_matrix)
+    for n in range(8, 0, -1):
+        placement = placement.replace("." * n, str(n))
+    return placement
 
 # Example
-# print(predict_image("tests/Example 1.png", predictionModel))
\ No newline at end of file
+# print(predict_image("tests/Example 1.png", get_model()))
\ No newline at end of file
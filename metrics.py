@@ -0,0 +1,123 @@
+"""
+Opt-in, in-process metrics for the scanning pipeline.
+
+Disabled by default: `timer()` then hands back one shared no-op context
+manager and `count()`/`observe()` return immediately, so instrumented hot
+paths only pay for a function call. Call `enable()` to start recording
+per-stage timings, tile counts and confidence histograms, and export them
+with `to_prometheus()` or `to_json()`.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+
+PREFIX = "chess_fen"
+TIME_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+CONFIDENCE_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0)
+
+enabled = False
+_lock = threading.Lock()
+_counters = {}       # (name, label) -> value
+_histograms = {}     # (name, label) -> [bucket counts..., +Inf count, sum]
+_buckets = {}        # name -> bucket bounds
+_noop = nullcontext()
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def count(name, label = "", value = 1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[(name, label)] = _counters.get((name, label), 0) + value
+
+def observe(name, values, label = "", buckets = CONFIDENCE_BUCKETS):
+    # `values` is a number or an iterable/array of numbers
+    if not enabled:
+        return
+    if not hasattr(values, "__iter__"):
+        values = (values,)
+    with _lock:
+        _buckets.setdefault(name, buckets)
+        hist = _histograms.get((name, label))
+        if hist is None:
+            hist = _histograms[(name, label)] = [0] * (len(buckets) + 2)
+        for value in values:
+            value = float(value)
+            hist[bisect_left(buckets, value)] += 1
+            hist[-1] += value
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe("stage_seconds", time.perf_counter() - self.start, self.stage, TIME_BUCKETS)
+        return False
+
+def timer(stage):
+    return _Timer(stage) if enabled else _noop
+
+def to_json():
+    with _lock:
+        counters = {}
+        for (name, label), value in _counters.items():
+            counters.setdefault(name, {})[label or "total"] = value
+        histograms = {}
+        for (name, label), hist in _histograms.items():
+            buckets = _buckets[name]
+            total = sum(hist[:-1])
+            histograms.setdefault(name, {})[label or "all"] = {
+                "count": total,
+                "sum": hist[-1],
+                "mean": hist[-1] / total if total else 0.0,
+                "buckets": {str(bound): n for bound, n in zip(list(buckets) + ["+Inf"], hist[:-1])},
+            }
+    return {"enabled": enabled, "counters": counters, "histograms": histograms}
+
+def _labels(name, label, extra = ""):
+    key = "stage" if name == "stage_seconds" else "kind"
+    parts = [f'{key}="{label}"'] if label else []
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def to_prometheus():
+    lines = []
+    with _lock:
+        for name in sorted({name for name, _ in _counters}):
+            lines.append(f"# TYPE {PREFIX}_{name} counter")
+            for (metric, label), value in sorted(_counters.items()):
+                if metric == name:
+                    lines.append(f"{PREFIX}_{name}{_labels(name, label)} {value}")
+        for name in sorted({name for name, _ in _histograms}):
+            lines.append(f"# TYPE {PREFIX}_{name} histogram")
+            for (metric, label), hist in sorted(_histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, n in zip(list(_buckets[name]) + ["+Inf"], hist[:-1]):
+                    cumulative += n
+                    le = f'le="{bound}"'
+                    lines.append(f"{PREFIX}_{name}_bucket{_labels(name, label, le)} {cumulative}")
+                lines.append(f"{PREFIX}_{name}_sum{_labels(name, label)} {hist[-1]}")
+                lines.append(f"{PREFIX}_{name}_count{_labels(name, label)} {cumulative}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,163 @@
+"""
+Multi-process inference pool for bulk board scanning.
+
+Each worker process loads the model once (after spawn, or fork when the
+parent has not imported TensorFlow), decodes its own share of the images
+and classifies them with `main.generate_board_batch`, so decoding and
+inference both scale with the number of cores. Every worker gets explicit
+intra-/inter-op thread counts instead of TensorFlow's one-thread-per-core
+defaults, which oversubscribe the machine as soon as several processes run,
+and can be pinned to its own set of CPUs.
+
+    with InferencePool(workers = 8, threads = 2, affinity = True) as pool:
+        for path, fen, error in pool.iter_fens(paths):
+            ...
+"""
+
+import os
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+CHUNK_BOARDS = 16        # boards per task, also one model call per task
+PREFETCH_CHUNKS = 2      # tasks queued per worker ahead of the results being read
+
+def available_cpus():
+    # the CPUs this process may run on; every CPU where the platform has no affinity API (macOS, Windows)
+    if hasattr(os, "sched_getaffinity"):
+        return os.sched_getaffinity(0)
+    return set(range(os.cpu_count() or 1))
+
+def cpu_sets(workers, threads, cpus = None):
+    # split the CPUs this process may run on into `workers` consecutive groups of `threads`
+    cpus = sorted(cpus if cpus is not None else available_cpus())
+    if workers * threads > len(cpus):
+        raise ValueError(f"{workers} workers x {threads} threads need {workers * threads} CPUs, only {len(cpus)} available")
+    return [set(cpus[i * threads:(i + 1) * threads]) for i in range(workers)]
+
+def _init_worker(options, cpu_queue):
+    if cpu_queue is not None:
+        os.sched_setaffinity(0, cpu_queue.get())
+
+    # the thread pools are sized when TensorFlow/oneDNN start, so before the model is loaded
+    threads, inter_op = options["threads"], options["inter_op_threads"]
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = str(inter_op)
+
+    import main
+    backend_options = {}
+    if options["backend"] in ("keras", "board"):
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    else:
+        backend_options["num_threads"] = threads
+    main.set_backend(options["backend"], options["quantization"], options["path"], **backend_options)
+    main.warmup()
+
+def _scan_chunk(paths, flips, batch_size = None):
+    # worker: [(fen or None, error or None)] for every path of the chunk
+    import main
+    import board
+
+    results, images, image_flips = [None] * len(paths), [], []
+    for i, path in enumerate(paths):
+        try:
+            images.append(main.open_board(path))
+            image_flips.append(flips[i])
+        except OSError as exc:
+            results[i] = (None, str(exc))
+
+    codes, valid = main.generate_board_batch(images, image_flips, batch_size or main.BATCH_SIZE, max_boards = len(paths))
+    fens = iter(board.to_fens(codes[valid]))
+    is_valid = iter(valid)
+    for i in range(len(paths)):
+        if results[i] is None:
+            results[i] = (next(fens), None) if next(is_valid) else (None, "board image is not square")
+    return results
+
+def _ready(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+class InferencePool:
+    def __init__(self, workers = None, threads = 1, inter_op_threads = 1, affinity = False,
+                 backend = "keras", quantization = "float32", path = None, start_method = "spawn"):
+        """
+        `workers` processes (default: available CPUs // `threads`), each running
+        the model with `threads` intra-op threads. `affinity` is False, True to
+        pin every worker to its own `threads` CPUs, or an explicit list of CPU
+        sets, one per worker.
+        """
+        self.workers = workers or max(1, len(available_cpus()) // threads)
+        context = multiprocessing.get_context(start_method)
+
+        cpu_queue = None
+        if affinity:
+            if not hasattr(os, "sched_setaffinity"):
+                raise ValueError("CPU affinity is not supported on this platform, run without it")
+            sets = cpu_sets(self.workers, threads) if affinity is True else [set(cpus) for cpus in affinity]
+            if len(sets) != self.workers:
+                raise ValueError(f"Expected {self.workers} CPU sets, got {len(sets)}")
+            cpu_queue = context.Queue()
+            for cpus in sets:
+                cpu_queue.put(cpus)
+
+        options = {
+            "threads": threads,
+            "inter_op_threads": inter_op_threads,
+            "backend": backend,
+            "quantization": quantization,
+            "path": path,
+        }
+        self.executor = ProcessPoolExecutor(self.workers, context, _init_worker, (options, cpu_queue))
+
+    def iter_fens(self, paths, flipped = False, chunk_boards = CHUNK_BOARDS, batch_size = None):
+        """
+        Yield (path, fen, error) for every path, in order. `fen` is None when the
+        image could not be read or is not square, and `error` says why.
+        `batch_size` is the number of tiles per model call (default: main.BATCH_SIZE).
+        At most PREFETCH_CHUNKS chunks per worker are in flight at a time.
+        """
+        flips = iter(flipped) if not isinstance(flipped, bool) else None
+        pending = deque()
+
+        def submit(chunk):
+            chunk_flips = [next(flips) for _ in chunk] if flips is not None else [flipped] * len(chunk)
+            pending.append((chunk, self.executor.submit(_scan_chunk, chunk, chunk_flips, batch_size)))
+
+        def drain():
+            chunk, future = pending.popleft()
+            for path, (fen, error) in zip(chunk, future.result()):
+                yield path, fen, error
+
+        chunk = []
+        for path in paths:
+            chunk.append(path)
+            if len(chunk) == chunk_boards:
+                submit(chunk)
+                chunk = []
+                if len(pending) >= self.workers * PREFETCH_CHUNKS:
+                    yield from drain()
+        if chunk:
+            submit(chunk)
+        while pending:
+            yield from drain()
+
+    def warmup(self):
+        # wait until every worker has loaded the model (a worker answers only after its initializer)
+        pids = set()
+        while len(pids) < self.workers:
+            pids.update(future.result() for future in [self.executor.submit(_ready, 0.05) for _ in range(self.workers)])
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+prefilter.py
+
+Cheap empty-square detector that runs before the CNN. An empty square is a
+flat patch of the board color, so its pixel variance and edge energy are
+close to zero, while any piece adds strong outlines. Only the center of the
+tile is inspected, which keeps coordinate labels drawn in the corner squares
+and thin highlight borders out of the measurement.
+
+The default thresholds were calibrated on the dataset/Pieces tiles and the
+empty squares of the dataset/Board screenshots, and are reported on the
+tests/ boards, which the calibration never sees.
+
+Usage (reports short-circuited tiles and accuracy cost on the tests/ boards):
+  python3 prefilter.py
+  python3 prefilter.py --false-empty-rate 0.01 --with-model
+"""
+
+import sys
+import argparse
+import numpy as np
+
+STD_THRESHOLD = 0.04      # calibration set: empty tiles <= 0.0001, occupied >= 0.081
+EDGE_THRESHOLD = 0.0075   # calibration set: empty tiles <= 0.0001, occupied >= 0.0155
+MARGIN = 0.15             # fraction of the tile ignored on every side
+
+def tile_features(batch, margin = MARGIN):
+    # (std, edge) per tile on the [0, 1] scale, for float32 or uint8 tiles
+    m_h, m_w = int(batch.shape[1] * margin), int(batch.shape[2] * margin)
+    inner = batch[:, m_h:batch.shape[1] - m_h, m_w:batch.shape[2] - m_w].mean(axis = -1)
+    std = inner.std(axis = (1, 2))
+    edge = np.abs(np.diff(inner, axis = 1)).mean(axis = (1, 2)) + np.abs(np.diff(inner, axis = 2)).mean(axis = (1, 2))
+    if batch.dtype == np.uint8:
+        std, edge = std / 255.0, edge / 255.0
+    return std, edge
+
+class EmptyFilter:
+    def __init__(self, std_threshold = STD_THRESHOLD, edge_threshold = EDGE_THRESHOLD, margin = MARGIN):
+        self.std_threshold = std_threshold
+        self.edge_threshold = edge_threshold
+        self.margin = margin
+        self.tiles = 0
+        self.skipped = 0
+
+    def mask(self, batch):
+        # True for tiles that are confidently empty and can skip the model
+        std, edge = tile_features(batch, self.margin)
+        empty = (std < self.std_threshold) & (edge < self.edge_threshold)
+        self.tiles += len(batch)
+        self.skipped += int(empty.sum())
+        return empty
+
+    def calibrate(self, batch, is_empty, false_empty_rate = 0.0):
+        # place both thresholds at the `false_empty_rate` quantile of the occupied tiles
+        std, edge = tile_features(batch, self.margin)
+        occupied = ~np.asarray(is_empty)
+        self.std_threshold = float(np.quantile(std[occupied], false_empty_rate))
+        self.edge_threshold = float(np.quantile(edge[occupied], false_empty_rate))
+        if false_empty_rate == 0.0:
+            # halfway to the flattest empty tile seen, rather than on the boundary
+            self.std_threshold = float((self.std_threshold + std[~occupied].max()) / 2)
+            self.edge_threshold = float((self.edge_threshold + edge[~occupied].max()) / 2)
+
+    def reset_stats(self):
+        self.tiles = self.skipped = 0
+
+    def stats(self):
+        return {
+            "tiles": self.tiles,
+            "skipped": self.skipped,
+            "skip_rate": self.skipped / self.tiles if self.tiles else 0.0,
+        }
+
+def load_calibration_tiles(styles = None):
+    # labeled tiles of every dataset theme (as in evaluate.py), disjoint from the example boards
+    import evaluate
+
+    tiles, codes = [], []
+    for _, theme_tiles, theme_codes in map(evaluate.load_theme, *zip(*evaluate.find_themes(styles))):
+        tiles.append(theme_tiles.astype(np.float32) / np.float32(255.0))
+        codes.append(theme_codes)
+    return np.concatenate(tiles), np.concatenate(codes) == 0
+
+def load_examples():
+    import main
+    from examples import examples
+
+    boards, labels = [], []
+    for path, is_flipped, placement in examples:
+        board_matrix = main.fen_to_matrix(placement)
+        if is_flipped:
+            board_matrix = main.flip_matrix(board_matrix)
+        boards.append(main.open_board(path))
+        labels.append(np.array(board_matrix).reshape(64))
+    return boards, labels
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Measure the empty-square pre-filter on the example boards.")
+    parser.add_argument("--false-empty-rate", type = float, help = "calibrate thresholds on the dataset tiles for this rate of occupied tiles flagged empty")
+    parser.add_argument("--with-model", action = "store_true", help = "also compare square accuracy with and without the filter")
+    return parser.parse_args(argv)
+
+def run(args):
+    import main
+
+    boards, labels = load_examples()
+    tiles = np.concatenate([main.board_tiles(img) for img in boards])
+    is_empty = np.concatenate(labels) == "."
+
+    empty_filter = EmptyFilter()
+    if args.false_empty_rate is not None:
+        empty_filter.calibrate(*load_calibration_tiles(), args.false_empty_rate)
+    flagged = empty_filter.mask(tiles)
+
+    print("---- PREFILTER ----")
+    print(f"Thresholds : std < {empty_filter.std_threshold:.4f}, edge < {empty_filter.edge_threshold:.4f}")
+    print(f"Tiles short-circuited : {int(flagged.sum())}/{len(tiles)} ({flagged.mean():.1%})")
+    print(f"Empty tiles caught : {int((flagged & is_empty).sum())}/{int(is_empty.sum())}")
+    print(f"Occupied tiles flagged empty : {int((flagged & ~is_empty).sum())}/{int((~is_empty).sum())}")
+
+    if args.with_model:
+        expected = np.concatenate(labels)
+        for name, active in (("model only", None), ("with filter", empty_filter)):
+            main.set_empty_filter(active)
+            main.set_tile_cache(0)
+            predicted = np.concatenate([np.array(main.generate_board_matrix(img)).reshape(64) for img in boards])
+            print(f"Square accuracy ({name}) : {np.mean(predicted == expected):.4f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
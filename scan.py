@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+scan.py
+
+Bulk-scan chessboard screenshots and write one FEN placement per image.
+
+Usage:
+  python3 scan.py tests/
+  python3 scan.py "screenshots/*.png" --flipped -o fens.tsv
+  python3 scan.py screenshots/ --workers 8 --threads 2 --affinity
+"""
+
+import os
+import sys
+import glob
+import argparse
+from collections import deque
+
+import main
+
+ALLOWED_EXT = (".png", ".jpg", ".jpeg")
+
+def iter_paths(sources):
+    for source in sources:
+        if os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                if name.lower().endswith(ALLOWED_EXT):
+                    yield os.path.join(source, name)
+        else:
+            yield from sorted(glob.glob(source))
+
+def iter_images(paths, scanned):
+    # `scanned` receives (path, error) for every path in order; error is None for the yielded images
+    for path in paths:
+        try:
+            img = main.open_board(path)
+        except OSError as exc:
+            scanned.append((path, str(exc)))
+            continue
+        scanned.append((path, None))
+        yield img
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Generate FEN placements for many chessboard images.")
+    parser.add_argument("sources", nargs = "+", help = "image directories, files or glob patterns")
+    parser.add_argument("--flipped", action = "store_true", help = "boards are seen from black's side")
+    parser.add_argument("--batch-size", type = int, default = main.BATCH_SIZE, help = "tiles per model call")
+    parser.add_argument("--max-boards", type = int, default = main.MAX_BOARDS, help = "boards held in memory at once")
+    parser.add_argument("--workers", type = int, default = 0, help = "inference worker processes (default: scan in this process)")
+    parser.add_argument("--threads", type = int, default = 1, help = "intra-op threads per worker process")
+    parser.add_argument("--affinity", action = "store_true", help = "pin every worker process to its own CPUs")
+    parser.add_argument("-o", "--output", help = "output file (default: stdout)")
+    return parser.parse_args(argv)
+
+def iter_results(args):
+    # (path, fen, error) for every image
+    if args.workers:
+        from pool import InferencePool
+        with InferencePool(args.workers, args.threads, affinity = args.affinity, backend = main.BACKEND) as pool:
+            yield from pool.iter_fens(iter_paths(args.sources), args.flipped, args.max_boards, args.batch_size)
+        return
+
+    scanned = deque()
+    images = iter_images(iter_paths(args.sources), scanned)
+    # open_board resizes every image to a square grid, so each opened image gets a FEN
+    for fen in main.iter_fen_batch(images, args.flipped, args.batch_size, args.max_boards):
+        path, error = scanned.popleft()
+        while error is not None:
+            yield path, None, error
+            path, error = scanned.popleft()
+        yield path, fen, None
+    for path, error in scanned:
+        yield path, None, error
+
+def run(args):
+    out = open(args.output, "w") if args.output else sys.stdout
+    total = failed = 0
+    try:
+        for path, fen, error in iter_results(args):
+            total += 1
+            if fen is None:
+                failed += 1
+                print(f"Skipping {path}: {error}", file = sys.stderr)
+                continue
+            out.write(f"{path}\t{fen}\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"✅ Scanned {total - failed}/{total} images", file = sys.stderr)
+    return 0 if failed == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+server.py
+
+Local HTTP inference server. Tiles from concurrent requests are queued and
+coalesced into one model call, bounded by a maximum batch size and a maximum
+wait time, so throughput grows with load instead of every request paying for
+its own forward pass.
+
+Endpoints:
+  POST /fen[?flipped=1]   body: PNG/JPEG bytes -> {"fen": "..."}
+  GET  /metrics           -> queue, batching and latency metrics as JSON
+  GET  /metrics/prometheus -> pipeline metrics in Prometheus text format (--instrument)
+
+Usage:
+  python3 server.py --port 8000
+  python3 server.py --unix /tmp/chess-fen.sock
+  curl --data-binary "@tests/Example 1.png" localhost:8000/fen
+"""
+
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+import main
+import metrics
+
+MAX_BATCH_TILES = 512          # tiles per coalesced model call
+MAX_WAIT_MS = 5.0              # how long the first queued board waits for company
+MAX_QUEUE = 64                 # queued boards before new requests get a 503
+MAX_BODY_BYTES = 16 * 2 ** 20
+DECODE_THREADS = 4
+LATENCY_WINDOW = 10000         # requests kept for the percentile metrics
+
+class Overloaded(Exception):
+    pass
+
+class BadRequest(Exception):
+    pass
+
+class MicroBatcher:
+    def __init__(self, max_batch = MAX_BATCH_TILES, max_wait = MAX_WAIT_MS / 1000, max_queue = MAX_QUEUE):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize = max_queue)
+        self.executor = ThreadPoolExecutor(max_workers = 1)   # one model call at a time
+        self.batches = 0
+        self.batched_tiles = 0
+
+    async def classify(self, tiles):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((tiles, future))
+        except asyncio.QueueFull:
+            raise Overloaded()
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            size = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                size += len(item[0])
+
+            batch = np.concatenate([tiles for tiles, _ in items])
+            try:
+                symbols = await loop.run_in_executor(self.executor, main.predict_squares, batch)
+            except Exception as exc:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            self.batches += 1
+            self.batched_tiles += len(batch)
+            offset = 0
+            for tiles, future in items:
+                if not future.done():
+                    future.set_result(symbols[offset:offset + len(tiles)])
+                offset += len(tiles)
+
+class FENServer:
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.decoder = ThreadPoolExecutor(max_workers = DECODE_THREADS)
+        self.latencies = deque(maxlen = LATENCY_WINDOW)
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+
+    @staticmethod
+    def decode(body):
+        # uint8 tiles: the tile cache hashes them and only model inputs are normalized
+        return main.board_pixels(main.open_board(io.BytesIO(body)))
+
+    async def scan(self, body, is_flipped):
+        try:
+            tiles = await asyncio.get_running_loop().run_in_executor(self.decoder, self.decode, body)
+        except (OSError, ValueError, Image.DecompressionBombError) as exc:
+            raise BadRequest(f"cannot read the image: {exc}")
+        board_matrix = main.to_matrix(await self.batcher.classify(tiles))
+        if is_flipped:
+            board_matrix = main.flip_matrix(board_matrix)
+        return main.matrix_to_fen(board_matrix)
+
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "queued_boards": self.batcher.queue.qsize(),
+            "batches": self.batcher.batches,
+            "mean_batch_tiles": self.batcher.batched_tiles / self.batcher.batches if self.batcher.batches else 0.0,
+            "latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "latency_p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            "tile_cache": main.tile_cache.stats() if main.tile_cache is not None else None,
+            "pipeline": metrics.to_json(),
+        }
+
+    async def respond(self, writer, status, payload, headers = ()):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        head = [f"HTTP/1.1 {status}", f"Content-Type: {content_type}", f"Content-Length: {len(body)}", "Connection: close"]
+        writer.write(("\r\n".join(head + list(headers)) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+        writer.close()
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+        except (ConnectionError, UnicodeDecodeError):
+            writer.close()
+            return
+        if len(request_line) < 2:
+            return await self.respond(writer, "400 Bad Request", {"error": "malformed request"})
+
+        method, target = request_line[0], urlsplit(request_line[1])
+        if method == "GET" and target.path == "/metrics":
+            return await self.respond(writer, "200 OK", self.metrics())
+        if method == "GET" and target.path == "/metrics/prometheus":
+            return await self.respond(writer, "200 OK", metrics.to_prometheus())
+        if method != "POST" or target.path != "/fen":
+            return await self.respond(writer, "404 Not Found", {"error": "use POST /fen or GET /metrics"})
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return await self.respond(writer, "400 Bad Request", {"error": "invalid Content-Length"})
+        if length <= 0:
+            return await self.respond(writer, "411 Length Required", {"error": "Content-Length of the image is required"})
+        if length > MAX_BODY_BYTES:
+            return await self.respond(writer, "413 Payload Too Large", {"error": f"expected at most {MAX_BODY_BYTES} bytes"})
+        try:
+            body = await reader.readexactly(length)
+        except asyncio.IncompleteReadError as exc:
+            return await self.respond(writer, "400 Bad Request", {"error": f"body ended after {len(exc.partial)} of {length} bytes"})
+        is_flipped = parse_qs(target.query).get("flipped", ["0"])[0] in ("1", "true")
+
+        start = time.perf_counter()
+        self.requests += 1
+        try:
+            fen = await self.scan(body, is_flipped)
+        except Overloaded:
+            self.rejected += 1
+            return await self.respond(writer, "503 Service Unavailable", {"error": "server busy"}, ["Retry-After: 1"])
+        except BadRequest as exc:
+            self.errors += 1
+            return await self.respond(writer, "400 Bad Request", {"error": str(exc)})
+        except Exception as exc:
+            # the model or backend failed, not the request
+            self.errors += 1
+            return await self.respond(writer, "500 Internal Server Error", {"error": str(exc)})
+        self.latencies.append(time.perf_counter() - start)
+        await self.respond(writer, "200 OK", {"fen": fen})
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Serve FEN generation over HTTP with dynamic micro-batching.")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8000)
+    parser.add_argument("--unix", help = "listen on this Unix socket instead of TCP")
+    parser.add_argument("--max-batch", type = int, default = MAX_BATCH_TILES, help = "tiles per model call")
+    parser.add_argument("--max-wait-ms", type = float, default = MAX_WAIT_MS)
+    parser.add_argument("--max-queue", type = int, default = MAX_QUEUE, help = "queued boards before rejecting")
+    parser.add_argument("--instrument", action = "store_true", help = "record per-stage pipeline metrics")
+    return parser.parse_args(argv)
+
+async def serve(args):
+    if args.instrument:
+        metrics.enable()
+    batcher = MicroBatcher(args.max_batch, args.max_wait_ms / 1000, args.max_queue)
+    server = FENServer(batcher)
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(batcher.executor, main.require_tile_model, "server.py")
+    except RuntimeError as exc:
+        print(f"ERROR: {exc}", file = sys.stderr)
+        return 1
+    await loop.run_in_executor(batcher.executor, main.warmup)
+
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle, path = args.unix)
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port)
+    print(f"✅ Listening on {args.unix or f'http://{args.host}:{args.port}'}", file = sys.stderr)
+
+    batching = asyncio.create_task(batcher.run())
+    async with listener:
+        await listener.serve_forever()
+    batching.cancel()
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(serve(parse_args())))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+stream.py
+
+Incremental scanner for live games. Each frame is compared square by square
+with the last classified frame and only squares whose pixels changed are sent
+to the model; a FEN is emitted whenever the position changes.
+
+Usage (frames as image files, e.g. from a screen recorder):
+  python3 stream.py frames/ --flipped
+"""
+
+import sys
+import argparse
+import numpy as np
+from PIL import Image
+
+import main
+
+CHANGE_THRESHOLD = 8.0   # mean absolute pixel difference (0-255) that marks a square as changed
+SAMPLE_STRIDE = 4        # compare every n-th pixel of a square in each direction
+
+class StreamScanner:
+    def __init__(self, flipped = False, change_threshold = CHANGE_THRESHOLD, stride = SAMPLE_STRIDE):
+        main.require_tile_model("StreamScanner")
+        self.flipped = flipped
+        self.change_threshold = change_threshold
+        self.stride = stride
+        self.board_size = (main.IMAGE_SIZE[0] * 8, main.IMAGE_SIZE[1] * 8)
+        self.previous = None            # (8, 8, h, w, 3) uint8 tiles of the last classified squares
+        self.symbols = np.full((8, 8), ".")
+        self.fen = None
+        self.frames = 0
+        self.tiles_classified = 0
+
+    def _frame_array(self, frame):
+        if isinstance(frame, np.ndarray):
+            if frame.dtype != np.uint8:
+                raise ValueError(f"Expected a uint8 frame, got {frame.dtype}")
+            if frame.ndim == 3 and frame.shape[2] in (3, 4) and frame.shape[:2] == self.board_size[::-1]:
+                return frame[..., :3]
+            # grayscale, or not at the board size yet
+            frame = Image.fromarray(frame)
+        w, h = frame.size
+        if w != h:
+            return None
+        frame = frame.convert("RGB")
+        if frame.size != self.board_size:
+            frame = frame.resize(self.board_size)
+        return np.asarray(frame)
+
+    def change_scores(self, grid):
+        if self.previous is None:
+            return np.full((8, 8), np.inf)
+        step = self.stride
+        current = grid[:, :, ::step, ::step].astype(np.int16)
+        previous = self.previous[:, :, ::step, ::step].astype(np.int16)
+        return np.abs(current - previous).mean(axis = (2, 3, 4))
+
+    def update(self, frame):
+        """
+        Feed one frame (PIL image, or uint8 RGB/RGBA/grayscale array). Returns
+        the new FEN placement when the position changed, otherwise None.
+        """
+        arr = self._frame_array(frame)
+        if arr is None:
+            return None
+        self.frames += 1
+
+        grid = main.tile_grid(arr)
+        changed = self.change_scores(grid) > self.change_threshold
+        if not changed.any():
+            return None
+
+        if self.previous is None:
+            self.previous = np.array(grid)
+        else:
+            self.previous[changed] = grid[changed]
+
+        tiles = grid[changed]
+        self.symbols[changed] = main.predict_squares(tiles)
+        self.tiles_classified += len(tiles)
+
+        board_matrix = self.symbols.tolist()
+        if self.flipped:
+            board_matrix = main.flip_matrix(board_matrix)
+        fen = main.matrix_to_fen(board_matrix)
+        if fen == self.fen:
+            return None
+        self.fen = fen
+        return fen
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "tiles_classified": self.tiles_classified,
+            "tiles_per_frame": self.tiles_classified / self.frames if self.frames else 0.0,
+        }
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Emit a FEN every time the position changes in a sequence of frames.")
+    parser.add_argument("sources", nargs = "+", help = "frame directories, files or glob patterns, in playback order")
+    parser.add_argument("--flipped", action = "store_true", help = "board is seen from black's side")
+    parser.add_argument("--change-threshold", type = float, default = CHANGE_THRESHOLD)
+    return parser.parse_args(argv)
+
+def run(args):
+    from scan import iter_paths
+
+    scanner = StreamScanner(args.flipped, args.change_threshold)
+    for index, path in enumerate(iter_paths(args.sources)):
+        fen = scanner.update(Image.open(path))
+        if fen is not None:
+            print(f"{index}\t{path}\t{fen}")
+    print(f"✅ {scanner.stats()}", file = sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+sweep.py
+
+Hyperparameter and architecture sweep over the tile model of CNN.py. Trials
+from a grid or random search space run in parallel worker processes that
+all read one preloaded uint8 copy of the dataset (memory-mapped, so the
+pages are shared instead of every worker decoding its own copy). Bad trials
+are stopped early, and every trial records its validation accuracy, model
+size and measured per-board (64 tiles) inference latency, ending with the
+speed/accuracy Pareto front.
+
+Usage:
+  python3 sweep.py --workers 4
+  python3 sweep.py --search random --trials 20 --epochs 10
+  python3 sweep.py --space space.json -o sweep.jsonl
+
+A space file maps each parameter to its candidate values, e.g.
+  {"image_size": [64, 96, 128], "filters": [[16, 32, 64], [32, 64, 128]],
+   "dense_units": [128, 256], "batch_size": [32, 64], "epochs": [20]}
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import tempfile
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image
+from pool import available_cpus
+
+# CNN (TensorFlow, sklearn) is imported where it is needed, so the helpers
+# below stay cheap to import
+OUTPUT_DIR = os.path.join("trained_models", "sweep")
+SEED = 42           # as in CNN.py
+SPACE = {
+    "image_size": [64, 96, 128],
+    "filters": [[16, 32, 64], [32, 64, 128]],
+    "dense_units": [128, 256],
+    "batch_size": [32, 64],
+    "epochs": [20],     # CNN.EPOCHS
+}
+PATIENCE = 3        # epochs without val_loss improvement before a trial stops
+GRACE_EPOCHS = 3    # epochs before a trial can be pruned
+PRUNE_MARGIN = 0.1  # pruned when this far below the best accuracy any trial reached
+LATENCY_RUNS = 20
+
+def trials_from_space(space, search = "grid", count = None, seed = SEED):
+    names = list(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    if search == "random":
+        grid = random.Random(seed).sample(grid, min(count or len(grid), len(grid)))
+    elif count:
+        grid = grid[:count]
+    return grid
+
+def preload(cache_dir = None, dataset_dir = None, shard_dir = None):
+    """
+    Decode the whole dataset once into a (N, h, w, 3) uint8 .npy file under
+    `cache_dir`, which every worker memory-maps. Taken from the shards when
+    they exist (already decoded at CNN.IMAGE_SIZE), otherwise from the images
+    of the flattened dataset. Returns (path, y_piece, y_color).
+    """
+    import CNN
+
+    dataset_dir, shard_dir = dataset_dir or CNN.DATASET_DIR, shard_dir or CNN.SHARD_DIR
+    manifest_path = os.path.join(shard_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        shards = {name: np.load(os.path.join(shard_dir, name), mmap_mode = "r") for name in manifest["shards"]}
+        # trials index one array, so the shard slots are gathered in manifest order
+        images = np.stack([shards[e["shard"]][e["index"]] for e in manifest["entries"]])
+        y_piece = np.array([e["piece"] for e in manifest["entries"]], dtype = np.int32)
+        y_color = np.array([e["color"] for e in manifest["entries"]], dtype = np.int32)
+    else:
+        paths, y_piece, y_color = CNN.list_dataset(dataset_dir)
+        images = np.stack([np.asarray(Image.open(path).convert("RGB").resize(CNN.IMAGE_SIZE, Image.BICUBIC)) for path in paths])
+
+    path = os.path.join(cache_dir or tempfile.gettempdir(), "sweep_images.npy")
+    np.save(path, images)
+    return path, y_piece, y_color
+
+# ---- worker process ----
+
+_worker = {}
+
+def _init_worker(images_path, y_piece, y_color, split, best, threads):
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    _worker.update(
+        images = np.load(images_path, mmap_mode = "r"),
+        y_piece = y_piece,
+        y_color = y_color,
+        split = split,
+        best = best,
+    )
+
+def _make_prune_callback(best, grace = GRACE_EPOCHS, margin = PRUNE_MARGIN):
+    from tensorflow.python.keras import callbacks
+
+    class Prune(callbacks.Callback):
+        # stops a trial that is far behind the best accuracy reached by any trial so far
+        pruned_at = None
+
+        def on_epoch_end(self, epoch, logs = None):
+            score = _score(logs)
+            if epoch + 1 >= grace and score < best.value - margin:
+                self.pruned_at = epoch + 1
+                self.model.stop_training = True
+
+    return Prune()
+
+def _make_best_epoch_callback():
+    from tensorflow.python.keras import callbacks
+
+    class BestEpoch(callbacks.Callback):
+        # keeps the weights and validation logs of the epoch with the best _score
+        score, epoch, logs, weights = -1.0, None, None, None
+
+        def on_epoch_end(self, epoch, logs = None):
+            score = _score(logs)
+            if score > self.score:
+                self.score, self.epoch, self.logs = score, epoch + 1, dict(logs)
+                self.weights = self.model.get_weights()
+
+    return BestEpoch()
+
+def _score(logs):
+    # one number per trial: mean of the piece and color validation accuracies
+    return (logs["val_piece_accuracy"] + logs["val_color_accuracy"]) / 2
+
+def _board_latency_ms(model, image_size, runs = LATENCY_RUNS):
+    import backends
+
+    compiled = backends.CompiledModel(model, (64,))
+    board = np.random.default_rng(SEED).random((64,) + tuple(image_size) + (3,), dtype = np.float32)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        compiled(board)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+def run_trial(trial_id, params, output_dir):
+    import tensorflow as tf
+    from tensorflow.python.keras import callbacks
+    import CNN
+
+    images, split, best = _worker["images"], _worker["split"], _worker["best"]
+    stored_size = images.shape[1:3]
+    image_size = (params["image_size"],) * 2 if isinstance(params["image_size"], int) else tuple(params["image_size"])
+
+    def load(index):
+        # preloaded pixels, resized here only when the trial uses another input size
+        img = tf.numpy_function(lambda i: images[i], [index], tf.uint8)
+        img.set_shape(stored_size + (3,))
+        img = tf.cast(img, tf.float32) / 255.0
+        if image_size != stored_size:
+            img = tf.image.resize(img, image_size, method = "bicubic", antialias = True)
+        return tf.clip_by_value(img, 0.0, 1.0)
+
+    train_idx, val_idx = split
+    datasets = [
+        CNN.make_dataset(idx, _worker["y_piece"][idx], _worker["y_color"][idx], training, load, params["batch_size"])
+        for idx, training in ((train_idx, True), (val_idx, False))
+    ]
+
+    tf.random.set_seed(SEED)
+    model = CNN.build_model(image_size, params["filters"], params["dense_units"])
+    prune, best_epoch = _make_prune_callback(best), _make_best_epoch_callback()
+    start = time.perf_counter()
+    history = model.fit(
+        datasets[0],
+        validation_data = datasets[1],
+        epochs = params["epochs"],
+        verbose = 0,
+        callbacks = [callbacks.EarlyStopping(monitor = "val_loss", patience = PATIENCE), prune, best_epoch],
+    )
+    train_seconds = time.perf_counter() - start
+
+    # the saved model, its latency and the reported accuracies all come from the best-scoring epoch
+    model.set_weights(best_epoch.weights)
+    accuracy = float(best_epoch.score)
+    with best.get_lock():
+        best.value = max(best.value, accuracy)
+
+    path = os.path.join(output_dir, f"trial_{trial_id}.h5")
+    model.save(path)
+    return {
+        "trial": trial_id,
+        "params": params,
+        "accuracy": accuracy,
+        "val_piece_accuracy": float(best_epoch.logs["val_piece_accuracy"]),
+        "val_color_accuracy": float(best_epoch.logs["val_color_accuracy"]),
+        "best_epoch": best_epoch.epoch,
+        "epochs": len(history.history["val_loss"]),
+        "pruned_at": prune.pruned_at,
+        "params_count": int(model.count_params()),
+        "size_mb": os.path.getsize(path) / 2 ** 20,
+        "board_latency_ms": _board_latency_ms(model, image_size),
+        "train_seconds": train_seconds,
+        "model_path": path,
+    }
+
+# ---- parent process ----
+
+def pareto_front(results):
+    # trials no other trial beats on both accuracy (higher) and latency (lower)
+    front = []
+    for r in results:
+        dominated = any(
+            o["accuracy"] >= r["accuracy"] and o["board_latency_ms"] <= r["board_latency_ms"]
+            and (o["accuracy"] > r["accuracy"] or o["board_latency_ms"] < r["board_latency_ms"])
+            for o in results
+        )
+        if not dominated:
+            front.append(r)
+    return sorted(front, key = lambda r: r["board_latency_ms"])
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Run a parallel hyperparameter/architecture sweep of the tile model.")
+    parser.add_argument("--space", help = "JSON file of parameter -> candidate values (default: SPACE)")
+    parser.add_argument("--search", choices = ["grid", "random"], default = "grid")
+    parser.add_argument("--trials", type = int, help = "number of trials (random search) or first N grid points")
+    parser.add_argument("--epochs", type = int, help = "override the epochs of every trial")
+    parser.add_argument("--workers", type = int, default = None, help = "trial processes (default: CPUs // threads)")
+    parser.add_argument("--threads", type = int, default = 1, help = "TensorFlow threads per trial process")
+    parser.add_argument("-o", "--output", default = os.path.join(OUTPUT_DIR, "sweep.jsonl"), help = "results file, one JSON line per trial")
+    return parser.parse_args(argv)
+
+def run(args):
+    from sklearn.model_selection import train_test_split
+
+    space = dict(SPACE)
+    if args.space:
+        with open(args.space) as f:
+            space.update(json.load(f))
+    if args.epochs:
+        space["epochs"] = [args.epochs]
+    trials = trials_from_space(space, args.search, args.trials)
+
+    output_dir = os.path.dirname(args.output) or "."
+    os.makedirs(output_dir, exist_ok = True)
+    images_path, y_piece, y_color = preload(cache_dir = output_dir)
+    if not len(y_piece):
+        print("ERROR: no images found in the dataset shards or the flattened dataset")
+        return 1
+    # the same split as CNN.py, for every trial
+    split = train_test_split(np.arange(len(y_piece)), test_size = 0.2, random_state = SEED, stratify = y_piece)
+
+    workers = args.workers or max(1, len(available_cpus()) // args.threads)
+    print(f"✅ {len(trials)} trials on {len(y_piece)} images, {workers} workers x {args.threads} threads")
+
+    context = multiprocessing.get_context("spawn")
+    best = context.Value("d", 0.0)
+    results = []
+    with open(args.output, "w") as out, ProcessPoolExecutor(
+        workers, context, _init_worker, (images_path, y_piece, y_color, split, best, args.threads)
+    ) as pool:
+        futures = {pool.submit(run_trial, i, params, output_dir): i for i, params in enumerate(trials)}
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            pruned = f", pruned at epoch {result['pruned_at']}" if result["pruned_at"] else ""
+            print(f"trial {result['trial']:>3}: accuracy {result['accuracy']:.4f}, {result['board_latency_ms']:.1f} ms/board, "
+                  f"{result['size_mb']:.1f} MB{pruned}  {json.dumps(result['params'])}")
+    os.remove(images_path)
+
+    print("---- PARETO FRONT (accuracy vs. board latency) ----")
+    for r in pareto_front(results):
+        print(f"trial {r['trial']:>3}: accuracy {r['accuracy']:.4f}, {r['board_latency_ms']:.1f} ms/board, {r['size_mb']:.1f} MB -> {r['model_path']}")
+    print(f"✅ Results saved at {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
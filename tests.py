@@ -1,6 +1,15 @@
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
 from PIL import Image
 import unittest
-from main import generate_board_matrix, matrix_to_fen
+import numpy as np
+from main import generate_board_matrix, matrix_to_fen, fen_to_matrix, board_tiles, load_board_tensor, board_array, BOARD_SIZE
+from tile_cache import TileCache
+import board
+from examples import examples, placements
 
 IMAGE_SIZE = (1024, 1024) 
 pre_process = lambda image_source: Image.open(image_source).convert("RGB").resize(IMAGE_SIZE)
@@ -10,19 +19,33 @@ def helper(img_src: str, is_flipped: bool) -> str:
     board_matrix = generate_board_matrix(img)
 
     # Base FEN
+    position = board.Board.from_matrix(board_matrix)
     if is_flipped:
-        board_matrix = [row[::-1] for row in board_matrix[::-1]]
-    
-    return matrix_to_fen(board_matrix)
-
-test_results = [
-    "4krnr/p5Q1/1pp1p3/3p1pP1/3P4/3N4/PPP1N1PP/R4RK1",
-    "7k/1bp3pp/3p4/1P1P1p2/3q4/1R4P1/2QBr2P/3R3K",
-    "rn1qkbnr/1pp2ppp/p2p4/4N3/2B1P1b1/2N5/PPPP1PPP/R1BQK2R",
-    "7k/2p3pp/3p4/1P1b1p2/3q4/1R4P1/2QBr2P/3R3K",
-    "4rrk1/ppp1bppp/3q1n2/4n3/2B1P1b1/1PP1QN2/PB1N1PPP/R4RK1",
-    "r4r1k/5ppp/p2p4/1p3N2/3QP1n1/P2P4/1P2KPq1/R3R3"
-]
+        position = position.flipped()
+
+    return position.to_fen()
+
+test_results = placements
+
+class StubModel:
+    # stands in for a loaded backend: every tile is a confident white pawn, calls are recorded
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, batch, batch_size = None):
+        self.calls.append(len(batch))
+        piece_pred = np.zeros((len(batch), 6), dtype = np.float32)
+        color_pred = np.zeros((len(batch), 2), dtype = np.float32)
+        piece_pred[:, 0] = color_pred[:, 1] = 1.0
+        return piece_pred, color_pred
+
+def use_model(test, model):
+    # install `model` as main's model (without a tile cache) until `test` ends
+    import main
+    test.addCleanup(setattr, main, "_model", main._model)
+    test.addCleanup(main.set_tile_cache)
+    main._model = model
+    main.set_tile_cache(0)
 
 class Test_Default(unittest.TestCase):
 
@@ -52,6 +75,296 @@ class Test_Flipped(unittest.TestCase):
         result = helper("tests/Example 5.png", True)
         self.assertEqual(result, test_results[4])
 
+class Test_FEN(unittest.TestCase):
+
+    def test_start_position(self):
+        board_matrix = [list("rnbqkbnr"), list("pppppppp")] + [list("........")] * 4 + [list("PPPPPPPP"), list("RNBQKBNR")]
+        self.assertEqual(matrix_to_fen(board_matrix), "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR")
+
+    def test_round_trip(self):
+        for fen in test_results:
+            self.assertEqual(matrix_to_fen(fen_to_matrix(fen)), fen)
+
+    def test_import_is_lazy(self):
+        code = "import sys, main; main.matrix_to_fen([['.'] * 8] * 8); sys.exit('tensorflow' in sys.modules)"
+        self.assertEqual(subprocess.run([sys.executable, "-c", code]).returncode, 0)
+
+class Test_FlatFolder(unittest.TestCase):
+
+    def test_rerun_adopts_existing_files(self):
+        script = os.path.abspath("dataset/Flat Folder.py")
+        with tempfile.TemporaryDirectory() as root:
+            # a destination flattened before the manifest existed, then two runs
+            for i, color in enumerate(("black", "white")):
+                src = os.path.join(root, "Neo", "Green", "pawn", color)
+                dst = os.path.join(root, "flattened_dataset", "pawn", color)
+                os.makedirs(src)
+                os.makedirs(dst)
+                Image.new("RGB", (8, 8), (i, 0, 0)).save(os.path.join(src, "Piece_1.png"))
+                shutil.copy(os.path.join(src, "Piece_1.png"), os.path.join(dst, "Piece_1.png"))
+            for _ in range(2):
+                subprocess.run([sys.executable, script], cwd = root, check = True, stdout = subprocess.DEVNULL)
+            for color in ("black", "white"):
+                self.assertEqual(os.listdir(os.path.join(root, "flattened_dataset", "pawn", color)), ["Piece_1.png"])
+
+class Test_Board(unittest.TestCase):
+
+    def test_batch_round_trip(self):
+        boards = board.from_fens(test_results)
+        self.assertEqual(boards.shape, (len(test_results), 64))
+        self.assertEqual(board.to_fens(boards), test_results)
+        self.assertTrue(board.check(boards).all())
+
+    def test_flip_and_matrix(self):
+        for fen in test_results:
+            position = board.Board.from_fen(fen)
+            flipped = [row[::-1] for row in fen_to_matrix(fen)[::-1]]
+            self.assertEqual(position.to_matrix(), fen_to_matrix(fen))
+            self.assertEqual(position.flipped().to_matrix(), flipped)
+            self.assertEqual(board.to_fens(board.flip(board.from_fens([fen])))[0], matrix_to_fen(flipped))
+
+    def test_sanity_checks(self):
+        self.assertEqual(board.Board.from_fen("8/8/8/8/8/8/8/k6K").problems(), [])
+        self.assertIn("white does not have exactly one king", board.Board.from_fen("8/8/8/8/8/8/8/k7").problems())
+        self.assertIn("pawns on the first or eighth rank", board.Board.from_fen("P7/8/8/8/8/8/8/k6K").problems())
+        self.assertIn("white has more promoted pieces than missing pawns", board.Board.from_fen("QQ6/8/8/8/8/8/PPPPPPPP/k6K").problems())
+
+    def test_malformed_fen(self):
+        for placement in ("8/8/8", "9/8/8/8/8/8/8/8", "7/8/8/8/8/8/8/9", "x7/8/8/8/8/8/8/8"):
+            with self.assertRaises(ValueError):
+                board.from_fens([placement])
+
+class Test_Prefilter(unittest.TestCase):
+
+    def test_held_out_tiles(self):
+        import prefilter
+        for tiles, is_empty in (prefilter.load_calibration_tiles(), self.example_tiles()):
+            flagged = prefilter.EmptyFilter().mask(tiles)
+            self.assertTrue(flagged[is_empty].all())
+            self.assertFalse(flagged[~is_empty].any())
+
+    def example_tiles(self):
+        import prefilter
+        boards, labels = prefilter.load_examples()
+        return np.concatenate([board_tiles(img) for img in boards]), np.concatenate(labels) == "."
+
+    def test_warmup_reaches_model(self):
+        import main
+        from prefilter import EmptyFilter
+        model = StubModel()
+        use_model(self, model)
+        self.addCleanup(main.set_empty_filter, main.empty_filter)
+        main.set_empty_filter(EmptyFilter())
+        main.warmup()
+        self.assertEqual(model.calls, [64])
+
+class Test_WholeBoard(unittest.TestCase):
+
+    def test_tile_callers_refuse_board_model(self):
+        from stream import StreamScanner
+        model = StubModel()
+        model.whole_board = True
+        use_model(self, model)
+        with self.assertRaises(RuntimeError):
+            StreamScanner()
+
+class Test_Server(unittest.TestCase):
+
+    def setUp(self):
+        import main
+        self.model = StubModel()
+        use_model(self, self.model)
+        self.addCleanup(main.set_empty_filter, main.empty_filter)
+        main.set_empty_filter(None)
+
+    def test_requests_are_coalesced(self):
+        import asyncio
+        from server import MicroBatcher
+
+        async def classify_boards():
+            batcher = MicroBatcher(max_batch = 256, max_wait = 0.05)
+            batching = asyncio.create_task(batcher.run())
+            boards = [np.full((64, 4, 4, 3), i / 4, dtype = np.float32) for i in range(3)]
+            results = await asyncio.gather(*(batcher.classify(tiles) for tiles in boards))
+            batching.cancel()
+            batcher.executor.shutdown()
+            return batcher, results
+
+        batcher, results = asyncio.run(classify_boards())
+        self.assertEqual(self.model.calls, [192])
+        self.assertEqual(batcher.batches, 1)
+        self.assertEqual([len(symbols) for symbols in results], [64] * 3)
+
+    def test_bad_framing_gets_400(self):
+        import asyncio
+        from server import MicroBatcher, FENServer
+
+        async def status(request):
+            server = FENServer(MicroBatcher())
+            listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+            reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+            writer.write(request)
+            writer.write_eof()
+            line = await reader.readline()
+            writer.close()
+            listener.close()
+            return line.split()[1]
+
+        for request, expected in ((b"POST /fen HTTP/1.1\r\nContent-Length: abc\r\n\r\n", b"400"),
+                                  (b"POST /fen HTTP/1.1\r\nContent-Length: 10\r\n\r\nabc", b"400"),
+                                  (b"POST /fen HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc", b"400"),
+                                  (b"POST /fen HTTP/1.1\r\n\r\n", b"411")):
+            self.assertEqual(asyncio.run(status(request)), expected)
+
+class Test_Scan(unittest.TestCase):
+
+    def test_unreadable_files_fail(self):
+        import scan
+        use_model(self, StubModel())
+        with tempfile.TemporaryDirectory() as root:
+            shutil.copy("tests/Example 1.png", os.path.join(root, "a.png"))
+            with open(os.path.join(root, "b.png"), "w") as file:
+                file.write("not an image")
+            output = os.path.join(root, "fens.tsv")
+            self.assertEqual(scan.run(scan.parse_args([root, "-o", output])), 1)
+            with open(output) as file:
+                self.assertEqual([line.split("\t")[0] for line in file], [os.path.join(root, "a.png")])
+
+class Test_Pool(unittest.TestCase):
+
+    def test_without_affinity_api(self):
+        import pool
+        # as on macOS and Windows
+        for name in ("sched_getaffinity", "sched_setaffinity"):
+            if hasattr(os, name):
+                self.addCleanup(setattr, os, name, getattr(os, name))
+                delattr(os, name)
+        self.assertEqual(pool.available_cpus(), set(range(os.cpu_count() or 1)))
+        with self.assertRaises(ValueError):
+            pool.InferencePool(workers = 1, affinity = True)
+
+class Test_Stream(unittest.TestCase):
+
+    def setUp(self):
+        self.model = StubModel()
+        use_model(self, self.model)
+
+    def test_only_changed_squares_are_classified(self):
+        from stream import StreamScanner
+        scanner = StreamScanner()
+        frame = np.zeros((1024, 1024, 3), dtype = np.uint8)
+        self.assertEqual(scanner.update(frame), "8/8/8/8/8/8/8/8")
+        self.assertIsNone(scanner.update(frame.copy()))
+
+        # a piece appears on a8: one tile reaches the model, the stub calls it a white pawn
+        frame[:128, :128] = np.random.default_rng(0).integers(0, 256, (128, 128, 3), dtype = np.uint8)
+        self.assertEqual(scanner.update(frame), "P7/8/8/8/8/8/8/8")
+        self.assertEqual(self.model.calls, [1])
+        self.assertEqual(scanner.stats()["tiles_classified"], 65)
+
+    def test_frame_validation(self):
+        from stream import StreamScanner
+        scanner = StreamScanner()
+        self.assertEqual(scanner.update(np.zeros((1024, 1024), dtype = np.uint8)), "8/8/8/8/8/8/8/8")
+        with self.assertRaises(ValueError):
+            scanner.update(np.zeros((1024, 1024, 3), dtype = np.float32))
+
+class Test_Metrics(unittest.TestCase):
+
+    def setUp(self):
+        import metrics
+        self.addCleanup(metrics.reset)
+        self.addCleanup(metrics.disable)
+        metrics.reset()
+        metrics.enable()
+        metrics.count("tiles", "classified", 64)
+        metrics.count("boards")
+        metrics.observe("confidence", [0.55, 0.97, 1.0], "piece")
+        with metrics.timer("inference"):
+            pass
+
+    def test_json_export(self):
+        import json
+        import metrics
+        data = json.loads(json.dumps(metrics.to_json()))
+        self.assertEqual(data["counters"], {"tiles": {"classified": 64}, "boards": {"total": 1}})
+        piece = data["histograms"]["confidence"]["piece"]
+        self.assertEqual((piece["count"], round(piece["sum"], 6)), (3, 2.52))
+        self.assertEqual({bound: n for bound, n in piece["buckets"].items() if n}, {"0.6": 1, "0.99": 1, "1.0": 1})
+        self.assertEqual(data["histograms"]["stage_seconds"]["inference"]["count"], 1)
+
+    def test_prometheus_export(self):
+        import re
+        import metrics
+        lines = metrics.to_prometheus().splitlines()
+        sample = re.compile(r'^chess_fen_\w+(\{\w+="[^"]*"(,\w+="[^"]*")*\})? -?[\d.e+-]+$')
+        for line in lines:
+            self.assertTrue(line.startswith("# TYPE chess_fen_") or sample.match(line), line)
+        for line in ('chess_fen_tiles{kind="classified"} 64', "chess_fen_boards 1", "# TYPE chess_fen_confidence histogram",
+                     'chess_fen_confidence_bucket{kind="piece",le="0.6"} 1', 'chess_fen_confidence_bucket{kind="piece",le="+Inf"} 3',
+                     'chess_fen_confidence_count{kind="piece"} 3', 'chess_fen_stage_seconds_count{stage="inference"} 1'):
+            self.assertIn(line, lines)
+        # buckets are cumulative
+        counts = [int(line.split()[-1]) for line in lines if line.startswith('chess_fen_confidence_bucket{kind="piece"')]
+        self.assertEqual(counts, sorted(counts))
+
+class Test_Preprocess(unittest.TestCase):
+
+    def test_direct_load_matches_resize_path(self):
+        for path, _, _ in examples:
+            expected = board_tiles(pre_process(image_source = path))
+            self.assertTrue(np.array_equal(load_board_tensor(path), expected))
+
+    def test_board_array(self):
+        board = board_array(pre_process(image_source = examples[0][0]))
+        self.assertEqual(board.shape, BOARD_SIZE + (3,))
+        self.assertTrue(0.0 <= board.min() and board.max() <= 1.0)
+        self.assertIsNone(board_array(Image.new("RGB", (800, 600))))
+
+class Test_TileCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = TileCache(max_entries = 2)
+        tiles = [np.full((4, 4, 3), value, dtype = np.float32) for value in (0.0, 0.5, 1.0)]
+        keys = [cache.key(tile) for tile in tiles]
+        cache.put(keys[0], ".")
+        cache.put(keys[1], "P")
+        cache.get(keys[0])
+        cache.put(keys[2], "k")
+        self.assertEqual(cache.get_many(keys), [".", None, "k"])
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+class Test_Sweep(unittest.TestCase):
+
+    def test_space_and_pareto_front(self):
+        import sweep
+        space = {"image_size": [64, 128], "dense_units": [128, 256]}
+        self.assertEqual(len(sweep.trials_from_space(space)), 4)
+        self.assertEqual(sweep.trials_from_space(space, "random", 2), sweep.trials_from_space(space, "random", 2))
+        results = [
+            {"trial": 0, "accuracy": 0.90, "board_latency_ms": 10.0},
+            {"trial": 1, "accuracy": 0.95, "board_latency_ms": 30.0},
+            {"trial": 2, "accuracy": 0.85, "board_latency_ms": 20.0},
+        ]
+        self.assertEqual([r["trial"] for r in sweep.pareto_front(results)], [0, 1])
+
+    def test_best_epoch_keeps_one_epoch(self):
+        import sweep
+
+        class Weights:
+            epoch = 0
+            def get_weights(self):
+                return [self.epoch]
+
+        callback, model = sweep._make_best_epoch_callback(), Weights()
+        callback.set_model(model)
+        # the best piece and color accuracies come from different epochs
+        for epoch, (piece, color) in enumerate([(0.9, 0.5), (0.8, 0.8), (0.6, 0.9)]):
+            model.epoch = epoch
+            callback.on_epoch_end(epoch, {"val_piece_accuracy": piece, "val_color_accuracy": color})
+        self.assertEqual((callback.epoch, callback.weights), (2, [1]))
+        self.assertEqual((callback.logs["val_piece_accuracy"], callback.logs["val_color_accuracy"]), (0.8, 0.8))
+
 # driver code
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Content-addressed cache of tile classifications.
+
+Boards of the same theme repeat many pixel-identical tiles (empty light/dark
+squares, pawns, ...), so the decoded FEN symbol of a tile is cached under a
+hash of its pixels and the model only sees tiles it has not classified
+before. main passes uint8 tiles, a quarter of the bytes of the normalized
+float32 model input.
+"""
+
+import threading
+from hashlib import blake2b
+from collections import OrderedDict
+
+class TileCache:
+    def __init__(self, max_entries = 4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tile):
+        return blake2b(tile.tobytes(), digest_size = 16).digest()
+
+    def get(self, key):
+        with self._lock:
+            symbol = self._entries.get(key)
+            if symbol is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return symbol
+
+    def get_many(self, keys):
+        # repeats of a missing key within `keys` count as hits, they are classified once
+        with self._lock:
+            symbols, missing = [], set()
+            for key in keys:
+                symbol = self._entries.get(key)
+                if symbol is not None:
+                    self._entries.move_to_end(key)
+                elif key not in missing:
+                    missing.add(key)
+                    self.misses += 1
+                    symbols.append(None)
+                    continue
+                self.hits += 1
+                symbols.append(symbol)
+            return symbols
+
+    def put(self, key, symbol):
+        with self._lock:
+            self._entries[key] = symbol
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last = False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)